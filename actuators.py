@@ -1,6 +1,9 @@
 import gc
 import time
-from machine import Pin, PWM
+import array
+import micropython
+from machine import Pin, PWM, Timer
+from utime import ticks_ms, ticks_diff, ticks_add
 from wio_link import PORT_MAPPING, DEFAULT_PORTS, GroveDevice
 gc.collect()
 
@@ -39,18 +42,148 @@ def degree2duty(degree, start=35, end=132):
     return int(start + (end - start) * (degree / 180))
 
 
+# PWM duty for every whole degree, so servo ramps need no float math per step
+SERVO_DUTY = bytes(degree2duty(d) for d in range(181))
+
+# Easing curves, mapping progress 0..1 to position 0..1
+EASINGS = {
+    "linear": lambda t: t,
+    "in": lambda t: t * t,
+    "out": lambda t: t * (2 - t),
+    "in_out": lambda t: 2 * t * t if t < 0.5 else 1 - 2 * (1 - t) * (1 - t),
+}
+
+
+class Ramp:
+    # A PWM change spread over time. The value for every tick is worked out
+    # when the ramp is made, so a tick is a table lookup and one duty() call.
+    # Values are duties, or indices into lookup (e.g. degrees in SERVO_DUTY).
+
+    def __init__(self, pwm, start, end, duration, easing="linear", lookup=None):
+        if easing not in EASINGS:
+            raise ValueError("Unknown easing {0}. Try one of {1}".format(easing, ", ".join(EASINGS)))
+        ease = EASINGS[easing]
+        steps = max(1, int(duration * 1000) // Ramps.PERIOD)
+        self.pwm = pwm
+        self.lookup = lookup
+        self.start = start
+        self.end = end
+        self.values = array.array("H", (round(start + (end - start) * ease((i + 1) / steps))
+                                        for i in range(steps)))
+        self.i = 0
+
+    def step(self):
+        # Sets the next value. Returns False once the ramp is over.
+        v = self.values[self.i]
+        self.pwm.duty(v if self.lookup is None else self.lookup[v])
+        self.i += 1
+        return self.i < len(self.values)
+
+    def value(self):
+        # the value last set
+        return self.values[self.i - 1] if self.i else self.start
+
+    def progress(self):
+        return self.i / len(self.values)
+
+    def done(self):
+        return self.i >= len(self.values)
+
+    def cancel(self):
+        # Stops the ramp where it is
+        ramps.remove(self)
+        self.i = len(self.values)
+
+    async def wait_async(self):
+        import uasyncio
+        while not self.done():
+            await uasyncio.sleep_ms(Ramps.PERIOD)
+
+
+class Ramps:
+    # Steps every running Ramp once per PERIOD ms, from a machine.Timer that
+    # only runs while there are ramps, or from run_async() when that is
+    # running. A new ramp on a PWM replaces the one running on it.
+    PERIOD = 20
+
+    def __init__(self):
+        self.active = []
+        self.timer = None
+        self.tasked = False
+
+    def add(self, ramp):
+        for r in self.active:
+            if r.pwm is ramp.pwm:
+                r.cancel()
+                break
+        self.active.append(ramp)
+        if self.timer is None and not self.tasked:
+            self.timer = Timer(-1)
+            self.timer.init(period=self.PERIOD, mode=Timer.PERIODIC, callback=self.tick)
+        return ramp
+
+    def remove(self, ramp):
+        if ramp in self.active:
+            self.active.remove(ramp)
+
+    def tick(self, timer=None):
+        # backwards, so finished ramps can be dropped on the way
+        i = len(self.active) - 1
+        while i >= 0:
+            if not self.active[i].step():
+                self.active.pop(i)
+            i -= 1
+        if not self.active and self.timer is not None:
+            self.timer.deinit()
+            self.timer = None
+
+    async def run_async(self):
+        # Drives the ramps from this task instead of a timer
+        import uasyncio
+        self.tasked = True
+        if self.timer is not None:
+            self.timer.deinit()
+            self.timer = None
+        try:
+            while True:
+                if self.active:
+                    self.tick()
+                await uasyncio.sleep_ms(self.PERIOD)
+        finally:
+            self.tasked = False
+
+
+ramps = Ramps()
+
+
 class Servo(Actuator):
 
     def __init__(self, port=DEFAULT_PORTS["Servo"], position=0):
         Actuator.__init__(self, "Servo", port)
         self.servo = PWM(Pin(PORT_MAPPING[port]), duty=degree2duty(position), freq=50)
         self.position = position
+        self.ramp = None
 
-    def set_position(self, degree):
-        self.servo.duty(degree2duty(degree))
+    def set_position(self, degree, duration=0, easing="in_out"):
+        # With a duration, sweeps to the position in the background instead
+        # of jumping there, and returns the Ramp
+        degree2duty(degree)
+        if self.ramp is not None and not self.ramp.done():
+            if duration and self.ramp.end == degree:
+                return self.ramp
+            self.ramp.cancel()
+        start = self.get_position()
         self.position = degree
+        if not duration or degree == start:
+            self.ramp = None
+            self.servo.duty(degree2duty(degree))
+            return None
+        self.ramp = ramps.add(Ramp(self.servo, int(start), int(degree), duration, easing, SERVO_DUTY))
+        return self.ramp
 
     def get_position(self):
+        if self.ramp is not None and not self.ramp.done():
+            return self.ramp.value()
         return self.position
 
 
@@ -71,30 +204,155 @@ class Relay(Actuator):
 
 
 class Button(Actuator):
+    # The pin interrupt only records debounced edges in a preallocated ring,
+    # so it never allocates. Dispatching them runs later through
+    # micropython.schedule(), which turns edges into "press", "release",
+    # "long" (held LONG_MS) and "double" (pressed again within DOUBLE_MS of
+    # a release) events. Each event goes to its callback and to a queue
+    # that the main loop can read with get() or get_async().
+    DEBOUNCE_MS = 20
+    LONG_MS = 800
+    DOUBLE_MS = 300
+    EDGES = 16
+    QUEUE_SIZE = 8
+
     def __init__(self, port=DEFAULT_PORTS["Button"]):
         Actuator.__init__(self, "Button", port)
         self.pin = Pin(PORT_MAPPING[port], Pin.IN, Pin.PULL_UP)
+        self.handlers = {}
+        self.queue = []
+        self.dropped = 0
+        # ring of edges: time and new level
+        self._times = array.array("L", [0] * self.EDGES)
+        self._levels = bytearray(self.EDGES)
+        self._head = 0
+        self._tail = 0
+        self._level = self.pin.value()
+        self._edge = ticks_add(ticks_ms(), -self.DEBOUNCE_MS)
+        # looks at the pin again once it has settled after an ignored edge
+        self._settle = Timer(-1)
+        self._settle_cb = self._irq
+        self._scheduled = False
+        self._dispatch_cb = self._dispatch
+        self._pressed_at = None
+        self._released_at = None
+        self._long = False
+        self._timer = Timer(-1)
+        self._long_cb = self._long_press
+        self.pin.irq(trigger=Pin.IRQ_RISING | Pin.IRQ_FALLING, handler=self._irq)
 
     def is_pressed(self):
         return True if self.pin.value() == 1 else False
 
+    def _irq(self, pin):
+        now = ticks_ms()
+        level = self.pin.value()
+        if level == self._level:
+            return
+        if ticks_diff(now, self._edge) < self.DEBOUNCE_MS:
+            self._settle.init(period=self.DEBOUNCE_MS, mode=Timer.ONE_SHOT, callback=self._settle_cb)
+            return
+        self._level = level
+        self._edge = now
+        i = self._head
+        self._times[i] = now
+        self._levels[i] = level
+        self._head = (i + 1) % self.EDGES
+        if self._head == self._tail:
+            # full, so lose the oldest edge
+            self._tail = (self._tail + 1) % self.EDGES
+            self.dropped += 1
+        if not self._scheduled:
+            try:
+                micropython.schedule(self._dispatch_cb, 0)
+                self._scheduled = True
+            except RuntimeError:
+                # the schedule queue is full; get() will catch up
+                pass
+
+    def _emit(self, event):
+        if len(self.queue) >= self.QUEUE_SIZE:
+            self.queue.pop(0)
+        self.queue.append(event)
+        handler = self.handlers.get(event)
+        if handler is not None:
+            handler(self.pin)
+
+    def _dispatch(self, arg=None):
+        self._scheduled = False
+        while self._tail != self._head:
+            i = self._tail
+            t = self._times[i]
+            level = self._levels[i]
+            self._tail = (i + 1) % self.EDGES
+            if level:
+                self._long = False
+                double = self._released_at is not None and ticks_diff(t, self._released_at) <= self.DOUBLE_MS
+                self._pressed_at = t
+                self._released_at = None
+                self._timer.init(period=self.LONG_MS, mode=Timer.ONE_SHOT, callback=self._long_cb)
+                self._emit("press")
+                if double:
+                    self._emit("double")
+            else:
+                self._timer.deinit()
+                # a long press does not start a double press
+                self._released_at = None if self._long else t
+                self._pressed_at = None
+                self._emit("release")
+
+    def _long_press(self, timer):
+        self._dispatch()
+        if self._pressed_at is not None and not self._long:
+            self._long = True
+            self._emit("long")
+
+    def on(self, event, callback):
+        # Calls callback(pin) on "press", "release", "long" or "double", or
+        # stops calling it with callback=None
+        if event not in ("press", "release", "long", "double"):
+            raise ValueError("Unknown button event {0}".format(event))
+        if callback is None:
+            self.handlers.pop(event, None)
+        else:
+            self.handlers[event] = callback
+
     def on_press(self, callback):
-        self.pin.irq(trigger=Pin.IRQ_RISING, handler=callback)
+        self.on("press", callback)
 
     def on_release(self, callback):
-        self.pin.irq(trigger=Pin.IRQ_FALLING, handler=callback)
+        self.on("release", callback)
+
+    def get(self):
+        # The oldest event not read yet, or None
+        self._dispatch()
+        return self.queue.pop(0) if self.queue else None
+
+    async def get_async(self, poll_ms=10):
+        import uasyncio
+        while True:
+            event = self.get()
+            if event is not None:
+                return event
+            await uasyncio.sleep_ms(poll_ms)
 
 
 class Buzzer(Actuator):
     def __init__(self, port=DEFAULT_PORTS["Buzzer"]):
         Actuator.__init__(self, "Buzzer", port)
         self.buzzer = PWM(Pin(PORT_MAPPING[port]))
+        self.timer = None
+        self.tune = None
+        self.index = 0
+        self.loop = False
+        self._next_cb = self._next
 
     def play_note(self, note, duration=0.5):
         if len(note) != 1:
             raise ValueError("This method only plays one note!")
         if note not in tones:
             raise ValueError("Note not supported!")
+        self.stop()
         try:
             self.buzzer.freq(tones[note])
             self.buzzer.duty(256)
@@ -102,19 +360,111 @@ class Buzzer(Actuator):
         finally:
             self.buzzer.deinit()
 
-    def play_music(self, notes, rhythms=None, tempo=1):
+    async def play_note_async(self, note, duration=0.5):
+        import uasyncio
+        if len(note) != 1:
+            raise ValueError("This method only plays one note!")
+        if note not in tones:
+            raise ValueError("Note not supported!")
+        self.stop()
+        try:
+            self.buzzer.freq(tones[note])
+            self.buzzer.duty(256)
+            await uasyncio.sleep_ms(int(duration*1000))
+        finally:
+            self.buzzer.deinit()
+
+    def _compile_music(self, notes, rhythms, tempo):
+        # the notes and rhythms of play_music() as a music tune, checked in
+        # the same pass
         if rhythms is None:
             rhythms = [1]*len(notes)
         if len(notes) != len(rhythms):
             raise ValueError("Rhythms must have same length as notes!")
-        if any(x <= 0 for x in rhythms):
-            raise ValueError("Rhythms cannot have zero or negative values!")
-        if any(note not in tones for note in notes):
-            raise ValueError("Some notes are not supported!")
+        tune = array.array("H")
+        for note, rhythm in zip(notes, rhythms):
+            if rhythm <= 0:
+                raise ValueError("Rhythms cannot have zero or negative values!")
+            if note not in tones:
+                raise ValueError("Some notes are not supported!")
+            tune.append(tones[note])
+            tune.append(max(int(tempo*1000/rhythm), 1))
+        return tune
+
+    def _tune(self, tune):
+        if isinstance(tune, str):
+            import music
+            tune = music.compile(tune)
+        return tune
+
+    def _sound(self, f):
+        if f:
+            self.buzzer.freq(f)
+            self.buzzer.duty(256)
+        else:
+            self.buzzer.duty(0)
+
+    def play_tune(self, tune):
+        # Plays an RTTTL string or compiled tune, blocking until it ends
+        tune = self._tune(tune)
+        self.stop()
+        try:
+            for i in range(0, len(tune), 2):
+                self._sound(tune[i])
+                time.sleep_ms(tune[i + 1])
+        finally:
+            self.buzzer.deinit()
+
+    async def play_tune_async(self, tune):
+        import uasyncio
+        tune = self._tune(tune)
+        self.stop()
         try:
-            for note, rhythm in zip(notes, rhythms):
-                self.buzzer.freq(tones[note])
-                self.buzzer.duty(256)
-                time.sleep(tempo/rhythm)
+            for i in range(0, len(tune), 2):
+                self._sound(tune[i])
+                await uasyncio.sleep_ms(tune[i + 1])
         finally:
-            self.buzzer.deinit()
\ No newline at end of file
+            self.buzzer.deinit()
+
+    def play(self, tune, loop=False):
+        # Starts an RTTTL string or compiled tune in the background and
+        # returns at once; a one-shot timer moves on to each next note
+        tune = self._tune(tune)
+        self.stop()
+        if not tune:
+            return
+        self.tune = tune
+        self.index = 0
+        self.loop = loop
+        self.timer = Timer(-1)
+        self._next(None)
+
+    def _next(self, timer):
+        if self.tune is None:
+            # stop() ran after this callback was already queued
+            return
+        i = self.index
+        if i >= len(self.tune):
+            if not self.loop:
+                self.stop()
+                return
+            i = 0
+        self._sound(self.tune[i])
+        self.index = i + 2
+        self.timer.init(period=self.tune[i + 1], mode=Timer.ONE_SHOT, callback=self._next_cb)
+
+    def is_playing(self):
+        return self.timer is not None
+
+    def stop(self):
+        if self.timer is not None:
+            self.timer.deinit()
+            self.timer = None
+            self.tune = None
+            self.buzzer.deinit()
+
+    def play_music(self, notes, rhythms=None, tempo=1):
+        self.play_tune(self._compile_music(notes, rhythms, tempo))
+
+    async def play_music_async(self, notes, rhythms=None, tempo=1):
+        await self.play_tune_async(self._compile_music(notes, rhythms, tempo))
@@ -9,6 +9,9 @@ import sys
 
 #import wifimgr
 #wlan = wifimgr.get_connection()
+#import dnscache
+# resolve the upload server now; BcServer (port 1880) and MQTT then hit
+#dnscache.prefetch(["ts.bc.edu"])
 
 Pin(13, Pin.OUT)
 p = Pin(0, Pin.IN, Pin.PULL_UP)
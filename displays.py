@@ -1,7 +1,8 @@
-from machine import Pin, PWM
+from machine import Pin, PWM, Timer
 from ssd1306 import SSD1306_I2C
 from neopixel import NeoPixel
 from wio_link import PORT_MAPPING, DEFAULT_PORTS, GroveDevice, i2c
+from actuators import Ramp, ramps
 import time
 
 class Display(GroveDevice):
@@ -13,7 +14,7 @@ class Display(GroveDevice):
 class OledScreen(Display, SSD1306_I2C):
     
     def __init__(self, port=DEFAULT_PORTS["OledScreen"], width=128, height=64, address=0x3c):
-        if address not in i2c.scan():
+        if not i2c.present(address):
             raise OSError("Please check if the OLED Screen is connected to Port 6 or an I2C hub")
         Display.__init__(self, "OledScreen", port)
         SSD1306_I2C.__init__(self, width, height, i2c, addr=address)
@@ -28,9 +29,8 @@ class OledScreen(Display, SSD1306_I2C):
 
     def clear_line(self, line):
         self._check_max_line(line)
-        for y in range(8*(line-1), 8*line):
-            for x in range(self.width):
-                self.pixel(x, y, 0)
+        # a text line is exactly one page of the buffer
+        self.clear_page(line - 1)
 
     def write_line(self, line, message):
         if not isinstance(message, str):
@@ -47,23 +47,170 @@ class OledScreen(Display, SSD1306_I2C):
         reading = sensor.show_data(self, line)
         return reading
 
+class Animation:
+    # Frames prepared up front, so showing one is a bytearray copy or a few
+    # byte stores plus NeoPixel.write(). Without a base, every frame is the
+    # whole strip. With one, the strip starts from base and every frame is a
+    # delta: records of a 2-byte pixel index and that pixel's bytes.
+
+    def __init__(self, frames, period, base=None):
+        self.frames = frames
+        self.period = period
+        self.base = base
+
+    def __len__(self):
+        return len(self.frames)
+
+
 class GrowLight(Display, NeoPixel):
+    # program name: (builder, default ms per frame)
+    PROGRAMS = {
+        "cycle": ("_cycle", 25),
+        "bounce": ("_bounce", 60),
+        "fade": ("_fade", 10),
+        "spectrum": ("_spectrum", 50),
+    }
+
     def __init__(self, port=DEFAULT_PORTS["GrowLight"], n=30):
         Display.__init__(self, "GrowLight", port)
         NeoPixel.__init__(self, pin=Pin(PORT_MAPPING[port]), n=n)
         self._on=False
+        self._dark = bytes(len(self.buf))
+        self._grow = b"".join(self._grow_color(i) for i in range(n))
+        self._animations = {}
+        self._anim = None
+        self._timer = None
+
+    def _color(self, color):
+        # color as the strip stores it
+        c = bytearray(self.bpp)
+        for i in range(self.bpp):
+            c[self.ORDER[i]] = color[i]
+        return bytes(c)
+
+    def _grow_color(self, i):
+        # red with every third pixel blue
+        return self._color((61, 0, 255) if i % 3 == 0 else (255, 0, 0))
+
+    def _delta(self, changes):
+        d = bytearray()
+        for i, c in changes:
+            d.append(i >> 8)
+            d.append(i & 0xff)
+            d.extend(c)
+        return bytes(d)
+
+    def _cycle(self):
+        # one white pixel running along the strip
+        n = self.n
+        off = self._color((0, 0, 0))
+        white = self._color((255, 255, 255))
+        frames = [self._delta((((i - 1) % n, off), (i, white))) for i in range(n)]
+        return Animation(frames, 25, self._dark)
+
+    def _bounce(self):
+        # one dark pixel going back and forth over blue
+        n = self.n
+        blue = self._color((0, 0, 128))
+        dark = self._color((0, 0, 0))
+        path = list(range(n)) + list(range(n - 1, -1, -1))
+        frames = [self._delta(((path[j - 1], blue), (path[j], dark))) for j in range(len(path))]
+        return Animation(frames, 60, blue * n)
+
+    def _fade(self):
+        # the red channel up and down over blue, one frame per level; the
+        # way down reuses the frames of the way up
+        levels = [self._color((val, 0, 128)) * self.n for val in range(0, 256, 8)]
+        return Animation(levels + levels[::-1], 10)
+
+    def _spectrum(self):
+        # switch the grow light pattern on pixel by pixel, then off again
+        n = self.n
+        off = self._color((0, 0, 0))
+        frames = [self._delta(((i, self._grow_color(i)),)) for i in range(n)]
+        frames += [self._delta(((i, off),)) for i in range(n)]
+        return Animation(frames, 50, self._dark)
+
+    def animation(self, program):
+        # Builds a program once and keeps it for the next time it is played
+        anim = self._animations.get(program)
+        if anim is None:
+            if program not in self.PROGRAMS:
+                raise ValueError("Unknown program {0}. Try one of {1}".format(program, ", ".join(self.PROGRAMS)))
+            anim = self._animations[program] = getattr(self, self.PROGRAMS[program][0])()
+        return anim
+
+    def _start(self, program, frames):
+        self.stop()
+        anim = program if isinstance(program, Animation) else self.animation(program)
+        if anim.base is not None:
+            self.buf[:] = anim.base
+        self._anim = anim
+        self._frame = 0
+        # frames left to show, None to loop forever
+        self._left = frames
+        return anim
+
+    def step(self):
+        # Shows the next frame of the playing animation. Returns False once
+        # it has shown all the frames it was asked for.
+        anim = self._anim
+        if anim is None or self._left == 0:
+            return False
+        f = anim.frames[self._frame]
+        if anim.base is None:
+            self.buf[:] = f
+        else:
+            bpp = self.bpp
+            k = 0
+            while k < len(f):
+                o = (f[k] << 8 | f[k + 1]) * bpp
+                for j in range(bpp):
+                    self.buf[o + j] = f[k + 2 + j]
+                k += 2 + bpp
+        NeoPixel.write(self)
+        self._frame = (self._frame + 1) % len(anim.frames)
+        if self._left is not None:
+            self._left -= 1
+        return True
+
+    def _tick(self, timer):
+        if not self.step():
+            self.stop()
+
+    def play(self, program="cycle", period=None, frames=None):
+        # Plays a program (or an Animation) in the background from a timer,
+        # for the given number of frames or until stop()
+        anim = self._start(program, frames)
+        self._timer = Timer(-1)
+        self._timer.init(period=period or anim.period, mode=Timer.PERIODIC, callback=self._tick)
+
+    async def play_async(self, program="cycle", period=None, frames=None):
+        import uasyncio
+        anim = self._start(program, frames)
+        period = period or anim.period
+        try:
+            while self._anim is anim and self.step():
+                await uasyncio.sleep_ms(period)
+        finally:
+            if self._anim is anim:
+                self._anim = None
+
+    def stop(self):
+        if self._timer is not None:
+            self._timer.deinit()
+            self._timer = None
+        self._anim = None
 
     def on(self):
-        blue_modulo = 3
-        for i in range(self.n):
-            NeoPixel.__setitem__(self, i, (255, 0, 0))
-            if i % blue_modulo == 0:
-                NeoPixel.__setitem__(self, i, (61, 0, 255))
+        self.stop()
+        self.buf[:] = self._grow
         NeoPixel.write(self)
         self._on=True
 
     def off(self):
-        NeoPixel.fill(self, (0, 0, 0))
+        self.stop()
+        self.buf[:] = self._dark
         NeoPixel.write(self)
         self._on=False
 
@@ -84,38 +231,26 @@ class GrowLight(Display, NeoPixel):
         finally:
             self.off()
 
+    async def blink_async(self, color=[255, 255, 255], times=3, interval=0.5):
+        import uasyncio
+        try:
+            self.off()
+            for i in range(times):
+                NeoPixel.fill(self, color)
+                NeoPixel.write(self)
+                await uasyncio.sleep_ms(int(interval*1000))
+                NeoPixel.fill(self, [0, 0, 0])
+                NeoPixel.write(self)
+                await uasyncio.sleep_ms(int(interval*1000))
+        finally:
+            self.off()
+
     def demo(self, program="cycle"):
         self.off()
-
         try:
-            n = self.n
-
-            if program == "cycle":
-                for i in range(4 * n):
-                    for j in range(n):
-                        NeoPixel.__setitem__(self, j, [0, 0, 0])
-                    NeoPixel.__setitem__(self, i % n, [255, 255, 255])
-                    NeoPixel.write(self)
-                    time.sleep_ms(25)
-            elif program == "bounce":
-                for i in range(4 * n):
-                    for j in range(n):
-                        NeoPixel.__setitem__(self, j, [0, 0, 128])
-                    if (i // n) % 2 == 0:
-                        NeoPixel.__setitem__(self, i % n, [0, 0, 0])
-                    else:
-                        NeoPixel.__setitem__(self, n - 1 - (i % n), [0, 0, 0])
-                    NeoPixel.write(self)
-                    time.sleep_ms(60)
-            elif program == "fade":
-                for i in range(0, 4 * 256, 8):
-                    for j in range(n):
-                        if (i // 256) % 2 == 0:
-                            val = i & 0xff
-                        else:
-                            val = 255 - (i & 0xff)
-                        NeoPixel.__setitem__(self, j, [val, 0, 128])
-                    NeoPixel.write(self)
+            anim = self._start(program, 128 if program == "fade" else 4 * self.n)
+            while self.step():
+                time.sleep_ms(anim.period)
         finally:
             self.off()
 
@@ -125,29 +260,50 @@ class Led(Display):
         Display.__init__(self, "Led", port)
         self.led = PWM(Pin(PORT_MAPPING[port]), freq=50, duty=0)
         self._on = False
-    
+        self.ramp = None
+
+    def fade_to(self, duty, duration=1, easing="linear"):
+        # Starts fading to duty (0-1023) in the background and returns the
+        # Ramp, which can be checked, cancelled or waited for
+        if self.ramp is not None:
+            self.ramp.cancel()
+        start = self.led.duty()
+        if duty == start:
+            self.ramp = None
+            return None
+        self.ramp = ramps.add(Ramp(self.led, start, duty, duration, easing))
+        return self.ramp
+
+    def _set(self, duty, fade, duration):
+        if fade:
+            return self.fade_to(duty, duration)
+        if self.ramp is not None:
+            self.ramp.cancel()
+            self.ramp = None
+        self.led.duty(duty)
+
     def on(self, fade=False, duration=1):
         if self._on:
             return
-        if fade:
-            for i in range(50):
-                self.led.duty(int(1023*((i+1)/50)))
-                time.sleep_ms(int(duration*1000/50))
-        else:
-            self.led.duty(1023)
         self._on=True
-    
+        return self._set(1023, fade, duration)
+
     def off(self, fade=False, duration=1):
         if not self._on:
             return
-        if fade:
-            for i in range(50):
-                self.led.duty(1023-int(1023*((i+1)/50)))
-                time.sleep_ms(int(duration*1000/50))
-        else:
-            self.led.duty(0)
         self._on=False
+        return self._set(0, fade, duration)
+
+    async def on_async(self, fade=False, duration=1):
+        ramp = self.on(fade, duration)
+        if ramp is not None:
+            await ramp.wait_async()
+
+    async def off_async(self, fade=False, duration=1):
+        ramp = self.off(fade, duration)
+        if ramp is not None:
+            await ramp.wait_async()
 
     def is_on(self):
         on = self._on
-        return on
\ No newline at end of file
+        return on
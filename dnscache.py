@@ -0,0 +1,96 @@
+import usocket
+from utime import ticks_ms, ticks_diff
+
+
+class Resolver:
+    # Caches getaddrinfo() results for ttl milliseconds, and failed lookups
+    # for negative_ttl, keeping at most size entries. Entries are per host,
+    # so one lookup serves every port: the port asked for replaces the one
+    # in each returned sockaddr. The family, socket type and protocol are
+    # those of the lookup that filled the entry, so callers should choose
+    # the socket type themselves rather than take it from the answer.
+
+    def __init__(self, ttl=300000, negative_ttl=30000, size=8):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.size = size
+        self.entries = {}
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+
+    def getaddrinfo(self, host, port, af=0, type=0, proto=0, flags=0):
+        key = host
+        entry = self.entries.get(key)
+        if entry is not None:
+            t, result = entry
+            if isinstance(result, int):
+                if ticks_diff(ticks_ms(), t) < self.negative_ttl:
+                    self.hits += 1
+                    raise OSError(result)
+            elif ticks_diff(ticks_ms(), t) < self.ttl:
+                self.hits += 1
+                return self._with_port(result, port)
+            del self.entries[key]
+        self.misses += 1
+        try:
+            result = usocket.getaddrinfo(host, port, af, type, proto, flags)
+        except OSError as e:
+            self.failures += 1
+            self._store(key, e.args[0] if e.args else -1)
+            raise
+        self._store(key, result)
+        return result
+
+    def _with_port(self, result, port):
+        if result[0][-1][1] == port:
+            return result
+        return [ai[:-1] + ((ai[-1][0], port) + tuple(ai[-1][2:]),) for ai in result]
+
+    def _store(self, key, result):
+        if len(self.entries) >= self.size:
+            oldest = None
+            for k in self.entries:
+                if oldest is None or ticks_diff(self.entries[oldest][0], self.entries[k][0]) > 0:
+                    oldest = k
+            del self.entries[oldest]
+        self.entries[key] = (ticks_ms(), result)
+
+    def forget(self, host=None):
+        # Drop cached answers for host (all hosts if None), e.g. after the
+        # cached address refused a connection.
+        for key in list(self.entries):
+            if host is None or key == host:
+                del self.entries[key]
+
+    def prefetch(self, hosts):
+        # Resolve hosts ahead of time, e.g. at boot right after the WiFi
+        # connects. Any later lookup of the host hits, whatever its port.
+        for host in hosts:
+            port = 80
+            if isinstance(host, tuple):
+                # (host, port) pairs are still accepted
+                host, port = host
+            try:
+                self.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)
+            except OSError:
+                pass
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses,
+                "failures": self.failures, "entries": len(self.entries)}
+
+
+resolver = Resolver()
+
+
+def getaddrinfo(host, port, af=0, type=0, proto=0, flags=0):
+    return resolver.getaddrinfo(host, port, af, type, proto, flags)
+
+
+def prefetch(hosts):
+    resolver.prefetch(hosts)
+
+
+def forget(host=None):
+    resolver.forget(host)
@@ -0,0 +1,186 @@
+from array import array
+
+_ITEMSIZE = {"b": 1, "B": 1, "h": 2, "H": 2, "i": 4, "I": 4, "f": 4}
+
+
+class _Extreme:
+    # Running min (lower=True) or max of one field of the ring: a monotonic
+    # deque of ring slots, oldest at the front, whose values get less extreme
+    # towards the back. The front is the extreme of everything held. Each
+    # slot is pushed and popped at most once per sample, so push() is O(1)
+    # amortized and value() is O(1).
+
+    def __init__(self, buffer, size, fields, field, lower):
+        self.buffer = buffer
+        self.size = size
+        self.fields = fields
+        self.field = field
+        self.lower = lower
+        typecode = "H" if size <= 0x10000 else "I"
+        self.slots = array(typecode, bytearray(size * _ITEMSIZE[typecode]))
+        self.clear()
+
+    def clear(self):
+        self.front = 0
+        self.n = 0
+
+    def push(self, slot, evict):
+        # slot has just been written; with evict it held the oldest sample
+        # before, which leaves the deque if it is still at the front
+        slots = self.slots
+        size = self.size
+        if evict and self.n and slots[self.front] == slot:
+            self.front += 1
+            if self.front == size:
+                self.front = 0
+            self.n -= 1
+        buf = self.buffer
+        fields = self.fields
+        field = self.field
+        v = buf[slot * fields + field]
+        while self.n:
+            back = self.front + self.n - 1
+            if back >= size:
+                back -= size
+            w = buf[slots[back] * fields + field]
+            if (w < v) if self.lower else (w > v):
+                break
+            self.n -= 1
+        back = self.front + self.n
+        if back >= size:
+            back -= size
+        slots[back] = slot
+        self.n += 1
+
+    def value(self):
+        return self.buffer[self.slots[self.front] * self.fields + self.field]
+
+
+class History:
+    # Fixed-size ring buffer of sensor samples. Multi-value readings such as
+    # (temperature, humidity) are stored interleaved, one field per value.
+    # Adding a sample is O(1) amortized and the whole-buffer count/min/max/
+    # mean are O(1); the running min and max cost two slot indexes per sample
+    # and field. Windowed queries over the last n samples walk the buffer in
+    # place.
+
+    def __init__(self, size, fields=1, typecode="f"):
+        if size < 1:
+            raise ValueError("The history must hold at least one sample")
+        if typecode not in _ITEMSIZE:
+            raise ValueError("Unsupported typecode: {0}".format(typecode))
+        self.size = size
+        self.fields = fields
+        self.typecode = typecode
+        self.buffer = array(typecode, bytearray(size * fields * _ITEMSIZE[typecode]))
+        self._sum = [0] * fields
+        self._min = [_Extreme(self.buffer, size, fields, f, True) for f in range(fields)]
+        self._max = [_Extreme(self.buffer, size, fields, f, False) for f in range(fields)]
+        self.clear()
+
+    def clear(self):
+        self._head = 0
+        self._count = 0
+        self.total = 0
+        for f in range(self.fields):
+            self._sum[f] = 0
+            self._min[f].clear()
+            self._max[f].clear()
+
+    def __len__(self):
+        return self._count
+
+    def count(self):
+        return self._count
+
+    def add(self, value):
+        buf = self.buffer
+        fields = self.fields
+        i = self._head * fields
+        full = self._count == self.size
+        for f in range(fields):
+            v = value[f] if fields > 1 else value
+            if full:
+                self._sum[f] -= buf[i + f]
+            buf[i + f] = v
+            self._sum[f] += buf[i + f]
+            self._min[f].push(self._head, full)
+            self._max[f].push(self._head, full)
+        if not full:
+            self._count += 1
+        self.total += 1
+        self._head += 1
+        if self._head == self.size:
+            self._head = 0
+            if self.typecode == "f":
+                # rounding errors accumulate in the float sums; re-add once per lap
+                self._resum()
+
+    def _resum(self):
+        for f in range(self.fields):
+            s = 0
+            for i in range(f, self._count * self.fields, self.fields):
+                s += self.buffer[i]
+            self._sum[f] = s
+
+    def _index(self, age, field):
+        # age 0 is the newest sample
+        i = self._head - 1 - age
+        if i < 0:
+            i += self.size
+        return i * self.fields + field
+
+    def _check(self, n):
+        if self._count == 0:
+            raise ValueError("The history is empty")
+        if n is None or n > self._count:
+            return self._count
+        if n < 1:
+            raise ValueError("The window must hold at least one sample")
+        return n
+
+    def latest(self, field=0):
+        self._check(1)
+        return self.buffer[self._index(0, field)]
+
+    def get(self, age, field=0):
+        if not 0 <= age < self._count:
+            raise IndexError("history index out of range")
+        return self.buffer[self._index(age, field)]
+
+    def min(self, n=None, field=0):
+        n = self._check(n)
+        if n == self._count:
+            return self._min[field].value()
+        buf = self.buffer
+        lo = buf[self._index(0, field)]
+        for age in range(1, n):
+            v = buf[self._index(age, field)]
+            if v < lo:
+                lo = v
+        return lo
+
+    def max(self, n=None, field=0):
+        n = self._check(n)
+        if n == self._count:
+            return self._max[field].value()
+        buf = self.buffer
+        hi = buf[self._index(0, field)]
+        for age in range(1, n):
+            v = buf[self._index(age, field)]
+            if v > hi:
+                hi = v
+        return hi
+
+    def mean(self, n=None, field=0):
+        n = self._check(n)
+        if n == self._count:
+            return self._sum[field] / n
+        buf = self.buffer
+        s = 0
+        for age in range(n):
+            s += buf[self._index(age, field)]
+        return s / n
+
+    def __repr__(self):
+        return "History of {0}/{1} samples".format(self._count, self.size)
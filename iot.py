@@ -3,7 +3,7 @@ import time
 import urequests
 import re
 from sensors import Sensor
-from utime import ticks_ms
+from utime import ticks_ms, ticks_diff
 
 class WiFi:
     
@@ -26,15 +26,83 @@ class WiFi:
                 else:
                     print("Connection unsuccessful. Retrying. {0} attempts left".format(i-1))
 
+    async def connect_async(self):
+        import uasyncio
+        if not self.wlan.isconnected():
+            for i in range(3, 0, -1):
+                print('Connecting to network "{0}"'.format(self.ssid))
+                self.wlan.connect(self.ssid, self.password)
+                for j in range(30):
+                    await uasyncio.sleep_ms(100)
+                    if self.wlan.isconnected():
+                        break
+                if self.wlan.isconnected():
+                    print("\nConnection Successful!")
+                    print("Network config:", self.wlan.ifconfig())
+                    return
+                else:
+                    print("Connection unsuccessful. Retrying. {0} attempts left".format(i-1))
+
     def __repr__(self):
         return "WiFi object with SSID: {0}".format(self.ssid)
 
 
+class Batch:
+    # Bounded buffer of timestamped samples that are posted together. Each
+    # sample is sent with its age in milliseconds at the time of the POST,
+    # so the server can place it in time without a real-time clock here.
+
+    def __init__(self, size=10, max_age=60000):
+        if size < 1:
+            raise ValueError("A batch must hold at least one sample")
+        self.size = size
+        self.max_age = max_age
+        self.samples = []
+
+    def add(self, sample):
+        if not isinstance(sample, dict):
+            # plain values such as the str or bytes send_http() also takes
+            # become {"value": ...} rows
+            if isinstance(sample, (bytes, bytearray)):
+                sample = sample.decode()
+            sample = {"value": sample}
+        if len(self.samples) >= self.size:
+            # the last flush failed, so make room by dropping the oldest sample
+            self.samples.pop(0)
+        self.samples.append((ticks_ms(), sample))
+
+    def due(self):
+        if not self.samples:
+            return False
+        if len(self.samples) >= self.size:
+            return True
+        return ticks_diff(ticks_ms(), self.samples[0][0]) >= self.max_age
+
+    def payload(self, data=None):
+        now = ticks_ms()
+        rows = []
+        for t, sample in self.samples:
+            row = dict(sample)
+            row["age"] = ticks_diff(now, t)
+            rows.append(row)
+        payload = dict(data) if data else {}
+        payload["samples"] = rows
+        return payload
+
+    def clear(self):
+        self.samples = []
+
+    def __len__(self):
+        return len(self.samples)
+
+
 class NodeRed:
 
     def __init__(self, ip, port=1880):
         self.ip = ip
         self.port = port
+        self.batches = {}
+        self.session = urequests.Session()
 
     def send_http(self, url, data, https=False, debug=True):
         if url[0] != "/":
@@ -45,55 +113,221 @@ class NodeRed:
             address = "http://{0}:{1}{2}".format(self.ip, self.port, url)
         try:
             if isinstance(data, dict):
-                r = urequests.post(address, json=data)
+                r = self.session.post(address, json=data)
+            else:
+                r = self.session.post(address, data=data)
+            r.close()
+            if debug:
+                print("Data sent!")
+            return True
+        except OSError:
+            print("Error! Please check your domain or IP address")
+        except:
+            print("Unknown error. Please check with an instructor.")
+        return False
+
+    async def send_http_async(self, url, data, debug=True):
+        if url[0] != "/":
+            url = "/" + url
+        address = "http://{0}:{1}{2}".format(self.ip, self.port, url)
+        try:
+            if isinstance(data, dict):
+                r = await urequests.post_async(address, json=data)
             else:
-                r = urequests.post(address, data=data)
+                r = await urequests.post_async(address, data=data)
             r.close()
             if debug:
                 print("Data sent!")
+            return True
         except OSError:
             print("Error! Please check your domain or IP address")
         except:
             print("Unknown error. Please check with an instructor.")
+        return False
+
+    def _batch(self, url, data, size, max_age):
+        batch = self.batches.get(url)
+        if batch is None:
+            batch = self.batches[url] = Batch(size, max_age)
+        batch.add(data)
+        return batch
+
+    def send_batched(self, url, data, size=10, max_age=60000, debug=True):
+        batch = self._batch(url, data, size, max_age)
+        if batch.due():
+            self.flush(url, debug=debug)
+
+    async def send_batched_async(self, url, data, size=10, max_age=60000, debug=True):
+        batch = self._batch(url, data, size, max_age)
+        if batch.due():
+            await self.flush_async(url, debug=debug)
+
+    def flush(self, url, debug=True):
+        batch = self.batches.get(url)
+        if batch and self.send_http(url, batch.payload(), debug=debug):
+            batch.clear()
+
+    async def flush_async(self, url, debug=True):
+        batch = self.batches.get(url)
+        if batch and await self.send_http_async(url, batch.payload(), debug=debug):
+            batch.clear()
 
     def __repr__(self):
         return "Node-RED at {0}:{1}".format(self.ip, self.port)
 
 
+# Default topic names for the fields of each sensor's get_data() reading
+FIELDS = {
+    "TemperatureSensor": ("temperature", "humidity"),
+    "TemperatureSensorPro": ("temperature", "humidity"),
+    "MoistureSensor": ("soil",),
+    "LightSensor": ("lux",),
+}
+
+
+class MqttPublisher:
+    # Publishes sensor readings to MQTT, one topic per field. A field is only
+    # published when it moves further than its deadband from the last value
+    # sent (the larger of absolute and relative * |last value|), or when
+    # heartbeat ms have passed since it was last sent.
+
+    def __init__(self, client, prefix="wiolink", retain=True, qos=0, heartbeat=3600000):
+        self.client = client
+        self.prefix = prefix
+        self.retain = retain
+        self.qos = qos
+        self.heartbeat = heartbeat
+        # [sensor, field, topic, absolute, relative, heartbeat, last value, sent at]
+        self.fields = []
+        self.sent = 0
+        self.suppressed = 0
+
+    def add(self, sensor, field=0, topic=None, absolute=0, relative=0, heartbeat=None):
+        if not isinstance(sensor, Sensor):
+            raise ValueError("Only Sensors can be published!")
+        if topic is None:
+            names = FIELDS.get(sensor.type)
+            if names is None or field >= len(names):
+                raise ValueError("Please give a topic for field {0} of {1}".format(field, sensor.type))
+            topic = "{0}/{1}".format(self.prefix, names[field])
+        self.fields.append([sensor, field, topic, absolute, relative,
+                            self.heartbeat if heartbeat is None else heartbeat, None, 0])
+
+    def _changes(self, readings):
+        # The fields to publish, as [(field, value)]; nothing is recorded as
+        # sent until _publish() has published them
+        now = ticks_ms()
+        changes = []
+        for f in self.fields:
+            value = readings[id(f[0])]
+            if isinstance(value, tuple):
+                value = value[f[1]]
+            last = f[6]
+            if last is None or ticks_diff(now, f[7]) >= f[5] \
+                    or abs(value - last) > max(f[3], f[4] * abs(last)):
+                changes.append((f, value))
+            else:
+                self.suppressed += 1
+        return changes
+
+    def _publish(self, changes):
+        if changes:
+            self.client.publish_many([(f[2], str(value)) for f, value in changes],
+                                     self.retain, self.qos)
+            now = ticks_ms()
+            for f, value in changes:
+                f[6] = value
+                f[7] = now
+            self.sent += len(changes)
+        return len(changes)
+
+    def update(self):
+        # Reads every sensor once and publishes the fields that changed.
+        # Returns how many messages were published.
+        readings = {}
+        for f in self.fields:
+            if id(f[0]) not in readings:
+                readings[id(f[0])] = f[0].get_data()
+        return self._publish(self._changes(readings))
+
+    async def update_async(self):
+        readings = {}
+        for f in self.fields:
+            if id(f[0]) not in readings:
+                readings[id(f[0])] = await f[0].get_data_async()
+        return self._publish(self._changes(readings))
+
+    def __repr__(self):
+        return "MQTT publisher with {0} fields under {1}".format(len(self.fields), self.prefix)
+
+
 class BcServer(NodeRed):
     
-    def __init__(self, team):
+    def __init__(self, team, batch=0, max_age=60000, interval=10000):
         if re.search("[we][abce]1?[0-9]$", team) is None:
             raise ValueError("Please set your team name in the format of 'wa1'")
         NodeRed.__init__(self, ip="ts.bc.edu", port=1880)
         self.data = { "team": team }
         self.last = None
+        self.interval = interval
+        # with batching on, readings are sampled every interval but posted
+        # together once batch samples are buffered or the oldest is max_age old
+        self.batch = Batch(batch, max_age) if batch else None
 
     def send_http(self, data, debug=True):
         address = "http://{0}:{1}/data".format(self.ip, self.port)
         try:
             if isinstance(data, dict):
-                r = urequests.post(address, json=data)
+                r = self.session.post(address, json=data)
             else:
-                r = urequests.post(address, data=data)
+                r = self.session.post(address, data=data)
             r.close()
             if debug:
                 print("Data sent!")
+            return True
         except OSError:
             print("Error! Please check your domain or IP address")
         except:
             print("Unknown error. Please check with an instructor.")
+        return False
+
+    async def send_http_async(self, data, debug=True):
+        return await NodeRed.send_http_async(self, "/data", data, debug=debug)
+
+    def _due(self):
+        return self.last is None or ticks_diff(ticks_ms(), self.last) >= self.interval
+
+    def _payload(self):
+        if self.batch is None:
+            return self.data
+        sample = dict(self.data)
+        del sample["team"]
+        self.batch.add(sample)
+        if not self.batch.due():
+            return None
+        return self.batch.payload({"team": self.data["team"]})
+
+    def _collect(self, sensor):
+        if isinstance(sensor, list):
+            for each_sensor in sensor:
+                self._sensor_to_data(each_sensor)
+        else:
+            self._sensor_to_data(sensor)
 
     def send_sensor_data(self, sensor, debug=True):
-        now = ticks_ms()
-        if self.last is None or now - self.last >= 10000:
-            if isinstance(sensor, list):
-                for each_sensor in sensor:
-                    self._sensor_to_data(each_sensor)
-            else:
-                self._sensor_to_data(sensor)
-            
-            self.send_http(data=self.data, debug=debug)
+        if self._due():
+            self._collect(sensor)
+            payload = self._payload()
+            if payload is not None and self.send_http(data=payload, debug=debug) and self.batch is not None:
+                self.batch.clear()
+            self.last = ticks_ms()
+
+    async def send_sensor_data_async(self, sensor, debug=True):
+        if self._due():
+            self._collect(sensor)
+            payload = self._payload()
+            if payload is not None and await self.send_http_async(data=payload, debug=debug) and self.batch is not None:
+                self.batch.clear()
             self.last = ticks_ms()
         
     def _sensor_to_data(self, sensor):
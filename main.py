@@ -3,6 +3,7 @@
 from sensors import TemperatureSensorPro, LightSensor
 from actuators import Relay, Servo
 from displays import OledScreen, GrowLight
+from runtime import Runtime
 import time
 
 print("Starting...")
@@ -10,7 +11,10 @@ time.sleep(5)
 
 ## set environment variables
 
-SAMPLE_RATE = 10 # Sends data every 10 seconds
+TEMP_RATE = 2000 # Reads the temperature every 2 seconds
+LIGHT_RATE = 1000 # Reads the light level every second
+DISPLAY_RATE = 2000 # Refreshes the screen every 2 seconds
+CONTROL_RATE = 1000 # Updates the relay, servo and grow light every second
 TEMP_THRESHOLD = 77
 LUX_THRESHOLD = 100
 
@@ -23,23 +27,55 @@ gl = GrowLight(5)
 light_sensor = LightSensor(6)
 screen = OledScreen(6)
 
-## main loop
+## tasks
+
+readings = {"temperature": None, "humidity": None, "lux": None}
+
+def read_temperature():
+    readings["temperature"], readings["humidity"] = temp_sensor.get_data()
+
+async def read_light():
+    readings["lux"] = await light_sensor.get_data_async()
 
-while True:
+shown = {}
 
-    t, h = temp_sensor.show_data(screen, 1)
-    l = light_sensor.show_data(screen, 2)
+def refresh_screen():
+    # only redraw lines whose readings changed since the last refresh
+    if readings["temperature"] is not None:
+        msg = ">{0}: {1}F {2}%".format(temp_sensor.port, readings["temperature"], readings["humidity"])
+        if shown.get(1) != msg:
+            screen.show_line(1, msg)
+            shown[1] = msg
+    if readings["lux"] is not None:
+        msg = ">{0}: {1} lux".format(light_sensor.port, readings["lux"])
+        if shown.get(2) != msg:
+            screen.show_line(2, msg)
+            shown[2] = msg
 
-    if t > TEMP_THRESHOLD:
-        relay.on()
-        servo.set_position(95)
-    else:
-        relay.off()
-        servo.set_position(175)
+def control():
+    t = readings["temperature"]
+    l = readings["lux"]
 
-    if l < LUX_THRESHOLD:
-        gl.on()
-    else:
-        gl.off()
+    if t is not None:
+        if t > TEMP_THRESHOLD:
+            relay.on()
+            servo.set_position(95, duration=1)
+        else:
+            relay.off()
+            servo.set_position(175, duration=1)
+
+    if l is not None:
+        if l < LUX_THRESHOLD:
+            if not gl.is_on():
+                gl.on()
+        elif gl.is_on():
+            gl.off()
+
+## main loop
 
-    time.sleep(SAMPLE_RATE)
\ No newline at end of file
+runtime = Runtime()
+runtime.every(TEMP_RATE, read_temperature)
+runtime.every(LIGHT_RATE, read_light)
+runtime.every(DISPLAY_RATE, refresh_screen)
+runtime.every(CONTROL_RATE, control)
+runtime.run()
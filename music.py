@@ -0,0 +1,113 @@
+import array
+
+# Tunes are compiled once into an array("H") of (frequency Hz, duration ms)
+# pairs, frequency 0 being a rest. The source is RTTTL,
+#   "alarm:d=8,o=6,b=180:c,p,c,p,4c"
+# or just its note list, optionally with the defaults in front,
+#   "d=8,o=5,b=120:c,e,g,2c6"   or   "4c 8e 8g 2c6"
+# Each note is [duration]letter[#][.][octave][.], letter a-g or p for a rest.
+
+# Octave 8, from which lower octaves are found by halving
+_OCTAVE_8 = (4186, 4435, 4699, 4978, 5274, 5588, 5920, 6272, 6645, 7040, 7459, 7902)
+_SEMITONES = {"c": 0, "d": 2, "e": 4, "f": 5, "g": 7, "a": 9, "b": 11}
+
+# The ESP8266 PWM tops out at 1 kHz, so higher notes are played octaves lower
+MAX_FREQ = 1000
+
+ALARM = "alarm:d=8,o=5,b=180:c6,p,c6,p,c6,p,4p"
+CHIME = "chime:d=4,o=5,b=140:8e,8g,8c6,2g"
+
+
+def freq(note, octave, max_freq=MAX_FREQ):
+    # Frequency in Hz of a note ("c" to "b", with an optional "#")
+    s = _SEMITONES[note[0]] + (1 if note[1:] == "#" else 0)
+    if s == 12:
+        s = 0
+        octave += 1
+    shift = 8 - octave
+    while True:
+        if shift > 0:
+            f = (_OCTAVE_8[s] + (1 << (shift - 1))) >> shift
+        else:
+            f = _OCTAVE_8[s] << -shift
+        if f <= max_freq:
+            return f
+        shift += 1
+
+
+def _defaults(header, d, o, b):
+    for item in header.split(","):
+        item = item.strip()
+        if not item:
+            continue
+        key, value = item.split("=", 1)
+        key = key.strip()
+        if key == "d":
+            d = int(value)
+        elif key == "o":
+            o = int(value)
+        elif key == "b":
+            b = int(value)
+        else:
+            raise ValueError("Unknown tune setting {0}".format(item))
+    return d, o, b
+
+
+def _note(token, d, o, whole, max_freq):
+    i = 0
+    n = len(token)
+    while i < n and token[i].isdigit():
+        i += 1
+    duration = int(token[:i]) if i else d
+    if i == n or token[i] not in "abcdefgp":
+        raise ValueError("Note {0} not supported!".format(token))
+    note = token[i]
+    i += 1
+    if i < n and token[i] == "#":
+        note += "#"
+        i += 1
+    dotted = False
+    if i < n and token[i] == ".":
+        dotted = True
+        i += 1
+    octave = o
+    if i < n and token[i].isdigit():
+        octave = int(token[i])
+        i += 1
+    if i < n and token[i] == ".":
+        dotted = True
+        i += 1
+    if i != n or duration <= 0:
+        raise ValueError("Note {0} not supported!".format(token))
+    ms = whole // duration
+    if dotted:
+        ms += ms // 2
+    return (0 if note == "p" else freq(note, octave, max_freq)), max(ms, 1)
+
+
+def compile(tune, max_freq=MAX_FREQ):
+    # Compiles RTTTL or a note list into a packed array, checking it in the
+    # same pass
+    parts = tune.split(":")
+    if len(parts) > 3:
+        raise ValueError("A tune has at most three parts separated by ':'")
+    d, o, b = 4, 6, 63
+    if len(parts) > 1:
+        d, o, b = _defaults(parts[-2], d, o, b)
+    if b <= 0:
+        raise ValueError("The tempo must be positive")
+    # a whole note lasts four beats
+    whole = 240000 // b
+    out = array.array("H")
+    for token in parts[-1].replace(" ", ",").split(","):
+        token = token.strip().lower()
+        if token:
+            f, ms = _note(token, d, o, whole, max_freq)
+            out.append(f)
+            out.append(ms)
+    return out
+
+
+def duration(tune):
+    # Length of a compiled tune in ms
+    return sum(tune[i] for i in range(1, len(tune), 2))
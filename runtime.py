@@ -0,0 +1,44 @@
+import uasyncio
+from utime import ticks_ms, ticks_add, ticks_diff
+
+
+class Runtime:
+
+    def __init__(self):
+        self.jobs = []
+        self.tasks = []
+
+    def every(self, period_ms, func, *args):
+        # func may be a plain function or an async one; either way it is
+        # called once per period without drifting.
+        self.jobs.append((period_ms, func, args))
+
+    def spawn(self, coro):
+        task = uasyncio.create_task(coro)
+        self.tasks.append(task)
+        return task
+
+    async def _periodic(self, period_ms, func, args):
+        deadline = ticks_ms()
+        while True:
+            try:
+                result = func(*args)
+                if hasattr(result, "send"):
+                    await result
+            except Exception as e:
+                print("Error in {0}: {1}".format(getattr(func, "__name__", func), e))
+            deadline = ticks_add(deadline, period_ms)
+            delay = ticks_diff(deadline, ticks_ms())
+            if delay < 0:
+                # overran the period, so skip the missed runs instead of bursting
+                deadline = ticks_ms()
+                delay = 0
+            await uasyncio.sleep_ms(delay)
+
+    async def main(self):
+        for period_ms, func, args in self.jobs:
+            self.spawn(self._periodic(period_ms, func, args))
+        await uasyncio.gather(*self.tasks)
+
+    def run(self):
+        uasyncio.run(self.main())
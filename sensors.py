@@ -1,74 +1,217 @@
-from machine import Pin, ADC
+from machine import Pin, ADC, Timer
 from dht import DHT11, DHT22
 from wio_link import PORT_MAPPING, DEFAULT_PORTS, GroveDevice, i2c
 from displays import Display
 
 from tsl2561 import TSL2561
+from history import History
 
-from utime import ticks_ms
+from utime import ticks_ms, ticks_diff
+import micropython
 
 class Sensor(GroveDevice):
-    def __init__(self, type, port):
+    # Readings are cached: get_data() and show_data() serve the last reading
+    # while it is younger than max_age ms, and never measure more often than
+    # min_interval ms, so a display and an upload in the same cycle share one
+    # acquisition
+    MIN_INTERVAL = 0
+    MAX_AGE = 500
+
+    def __init__(self, type, port, history=0, fields=1, typecode="f"):
         GroveDevice.__init__(self, type, port)
-    
-    def get_data(self):
+        self.history = History(history, fields, typecode) if history else None
+        self.min_interval = self.MIN_INTERVAL
+        self.max_age = self.MAX_AGE
+        self.reading = None
+        # ticks_ms of the cached reading, None before the first
+        self.last_measure = None
+
+    def _record(self, reading):
+        if self.history is not None:
+            self.history.add(reading)
+        return reading
+
+    def _store(self, reading):
+        self.reading = reading
+        self.last_measure = ticks_ms()
+        return self._record(reading)
+
+    def age(self):
+        # ms since the cached reading was measured, None if there is none
+        if self.last_measure is None:
+            return None
+        return ticks_diff(ticks_ms(), self.last_measure)
+
+    def _fresh(self, max_age):
+        age = self.age()
+        if age is None:
+            return False
+        if max_age is None:
+            max_age = self.max_age
+        return age < max(max_age, self.min_interval)
+
+    def _acquire(self):
+        # reads the hardware; overridden by every sensor
         pass
 
+    async def _acquire_async(self):
+        return self._acquire()
+
+    def get_data(self, max_age=None):
+        # max_age overrides the sensor's staleness limit for this call;
+        # get_data(0) measures unless min_interval forbids it
+        if not self._fresh(max_age):
+            self._store(self._acquire())
+        return self.reading
+
+    async def get_data_async(self, max_age=None):
+        if not self._fresh(max_age):
+            self._store(await self._acquire_async())
+        return self.reading
+
     def show_data(self, screen, line):
         pass
 
 
 class LightSensor(Sensor, TSL2561):
-    def __init__(self, port=DEFAULT_PORTS["LightSensor"], address=0x29):
-        Sensor.__init__(self, "LightSensor", port)
-        if address not in i2c.scan():
+    # how soon watch() looks again after an interrupt found the bus busy
+    RETRY_MS = 10
+
+    def __init__(self, port=DEFAULT_PORTS["LightSensor"], address=0x29, history=0):
+        Sensor.__init__(self, "LightSensor", port, history)
+        if not i2c.present(address):
             raise OSError("Please check if the light sensor is connected to Port 6 or an I2C hub")
 
         TSL2561.__init__(self, i2c, address = address)
+        # INT pin while watch() is on
+        self.watching = None
+        self.lux = None
+        self.changes = 0
+        self.band = 0.2
+        self._band = (0, 0)
+        self._on_change = None
+        self._check_cb = self._check
+        # looks again when the bus was busy at the interrupt
+        self._retry = Timer(-1)
+        self._retry_cb = self._irq
 
-    def get_lux(self):
-        return TSL2561.read(self)
+    def watch(self, int_port, callback=None, band=0.2, cycles=2):
+        # Reports the light only when it leaves a band of +-band around the
+        # last reading. The sensor keeps converting and pulls its INT line
+        # (wired to the signal pin of int_port) low once cycles readings in a
+        # row fall outside the band, so nothing is polled in between. Each
+        # change re-centres the band and calls callback(lux) through
+        # micropython.schedule. The band applies to the broadband channel.
+        if int_port not in PORT_MAPPING:
+            raise ValueError("Port {0} does not exist. Please use one of Ports 1 to 5 for the INT line.".format(int_port))
+        if int_port == 6:
+            # its signal pin is the bus clock, which toggles on every transfer
+            raise ValueError("Port 6 is the I2C bus. Please use one of Ports 1 to 5 for the INT line.")
+        self.unwatch()
+        self.band = band
+        self._on_change = callback
+        channels = TSL2561._read(self)
+        self.active(True)
+        self._rearm(channels)
+        self.threshold(cycles)
+        self.watching = Pin(PORT_MAPPING[int_port], Pin.IN, Pin.PULL_UP)
+        self.watching.irq(trigger=Pin.IRQ_FALLING, handler=self._irq)
+        return self.lux
+
+    def unwatch(self):
+        if self.watching is None:
+            return
+        self.watching.irq(handler=None)
+        self.watching = None
+        self._retry.deinit()
+        self.threshold(-1)
+        self.interrupt(False)
+        self.active(self.continuous())
 
-    def get_data(self):
+    def _rearm(self, channels):
+        broadband = channels[0]
+        low = int(broadband * (1 - self.band))
+        high = min(0xffff, int(broadband * (1 + self.band)) + 1)
+        self._band = (low, high)
+        self.threshold(None, low, high)
+        self.interrupt(False)
+        try:
+            self.lux = self._lux(channels)
+        except ValueError:
+            # saturated
+            self.lux = None
+
+    def _irq(self, pin):
+        try:
+            micropython.schedule(self._check_cb, 0)
+        except RuntimeError:
+            pass
+
+    def _check(self, arg):
+        if self.watching is None:
+            return
+        if self.i2c.busy():
+            # scheduled in the middle of someone else's transfer; INT stays
+            # low until it is cleared, so nothing is lost by looking later
+            self._retry.init(period=self.RETRY_MS, mode=Timer.ONE_SHOT, callback=self._retry_cb)
+            return
+        channels = TSL2561._read(self)
+        if self._band[0] <= channels[0] <= self._band[1]:
+            # back inside the band already
+            self.interrupt(False)
+            return
+        self._rearm(channels)
+        self.changes += 1
+        if self.lux is not None:
+            self._store(self.lux)
+        if self._on_change is not None:
+            self._on_change(self.lux)
+
+    def _acquire(self):
         return TSL2561.read(self)
 
+    async def _acquire_async(self):
+        return await TSL2561.read_async(self)
+
+    def get_lux(self, max_age=None):
+        return self.get_data(max_age)
+
+    async def get_lux_async(self, max_age=None):
+        return await self.get_data_async(max_age)
+
     def show_data(self, screen, line):
         if not isinstance(screen, Display):
             raise TypeError("The 'screen' parameter must be an instance of Display!")
-        reading = TSL2561.read(self)
+        reading = self.get_data()
         msg = ">{0}: {1} lux".format(self.port, reading)
         screen.show_line(line, msg)
         return reading
 
 
 class TemperatureSensor(Sensor, DHT11):
-    def __init__(self, port=DEFAULT_PORTS["TemperatureSensor"]):
-        Sensor.__init__(self, "TemperatureSensor", port)
+    # the DHT11 measures at most once a second
+    MIN_INTERVAL = 1000
+
+    def __init__(self, port=DEFAULT_PORTS["TemperatureSensor"], history=0):
+        Sensor.__init__(self, "TemperatureSensor", port, history, fields=2)
         DHT11.__init__(self, Pin(PORT_MAPPING[port]))
-        self.last_measure = 0
-
-    def _check_refresh(self, min_refresh_rate):
-        now = ticks_ms()
-        if self.last_measure == 0 or now - self.last_measure > min_refresh_rate:
-            try:
-                DHT11.measure(self)
-            except OSError:
-                raise OSError("Please check if sensor is connected to Port {0}".format(self.port))
-        self.last_measure = now
-
-    def get_temperature(self, celsius=False):
-        self._check_refresh(1000)
+
+    def _acquire(self):
+        try:
+            DHT11.measure(self)
+        except OSError:
+            raise OSError("Please check if sensor is connected to Port {0}".format(self.port))
+        return (DHT11.temperature(self) * 1.8 + 32, DHT11.humidity(self))
+
+    def get_temperature(self, celsius=False, max_age=None):
+        reading = self.get_data(max_age)
         if celsius:
+            # the driver still holds the cached measurement
             return DHT11.temperature(self)
-        return DHT11.temperature(self) * 1.8 + 32
-        
-    def get_humidity(self):
-        self._check_refresh(1000)
-        return DHT11.humidity(self)
-
-    def get_data(self):
-        self._check_refresh(1000)
-        return (DHT11.temperature(self) * 1.8 + 32, DHT11.humidity(self))
+        return reading[0]
+
+    def get_humidity(self, max_age=None):
+        return self.get_data(max_age)[1]
 
     def show_data(self, screen, line):
         if not isinstance(screen, Display):
@@ -80,33 +223,28 @@ class TemperatureSensor(Sensor, DHT11):
 
 
 class TemperatureSensorPro(Sensor, DHT22):
-    def __init__(self, port=DEFAULT_PORTS["TemperatureSensor"]):
-        Sensor.__init__(self, "TemperatureSensorPro", port)
+    MIN_INTERVAL = 500
+
+    def __init__(self, port=DEFAULT_PORTS["TemperatureSensor"], history=0):
+        Sensor.__init__(self, "TemperatureSensorPro", port, history, fields=2)
         DHT22.__init__(self, Pin(PORT_MAPPING[port]))
-        self.last_measure = 0
-
-    def _check_refresh(self, min_refresh_rate):
-        now = ticks_ms()
-        if self.last_measure == 0 or now - self.last_measure > min_refresh_rate:
-            try:
-                DHT22.measure(self)
-            except OSError:
-                raise OSError("Please check if sensor is connected to Port {0}".format(self.port))
-        self.last_measure = now
-
-    def get_temperature(self, celsius=False):
-        self._check_refresh(500)
+
+    def _acquire(self):
+        try:
+            DHT22.measure(self)
+        except OSError:
+            raise OSError("Please check if sensor is connected to Port {0}".format(self.port))
+        return (DHT22.temperature(self) * 1.8 + 32, DHT22.humidity(self))
+
+    def get_temperature(self, celsius=False, max_age=None):
+        reading = self.get_data(max_age)
         if celsius:
+            # the driver still holds the cached measurement
             return DHT22.temperature(self)
-        return DHT22.temperature(self) * 1.8 + 32
-        
-    def get_humidity(self):
-        self._check_refresh(500)
-        return DHT22.humidity(self)
-
-    def get_data(self):
-        self._check_refresh(500)
-        return (DHT22.temperature(self) * 1.8 + 32, DHT22.humidity(self))
+        return reading[0]
+
+    def get_humidity(self, max_age=None):
+        return self.get_data(max_age)[1]
 
     def show_data(self, screen, line):
         if not isinstance(screen, Display):
@@ -118,20 +256,20 @@ class TemperatureSensorPro(Sensor, DHT22):
 
 
 class MoistureSensor(Sensor):
-    def __init__(self, port=DEFAULT_PORTS["MoistureSensor"]):
-        Sensor.__init__(self, "MoistureSensor", port)
+    def __init__(self, port=DEFAULT_PORTS["MoistureSensor"], history=0):
+        Sensor.__init__(self, "MoistureSensor", port, history, typecode="H")
         self.pin = ADC(0)
 
-    def get_moisture(self):
+    def _acquire(self):
         return self.pin.read()
 
-    def get_data(self):
-        return self.pin.read()
+    def get_moisture(self, max_age=None):
+        return self.get_data(max_age)
 
     def show_data(self, screen, line):
         if not isinstance(screen, Display):
             raise TypeError("The 'screen' parameter must be an instance of Display!")
-        reading = self.pin.read()
+        reading = self.get_data()
         msg = ">{0}: {1}".format(self.port, reading)
         screen.show_line(line, msg)
         return reading
@@ -2,6 +2,9 @@ import re
 import urequests
 from iot import WiFi
 
+# Reuses the connection to the sheet server between data points
+session = urequests.Session()
+
 
 def initWiFi(ssid, password):
     wifi = WiFi(ssid, password)
@@ -13,6 +16,6 @@ def logData(token, key, value, url):
     
     thedata = {"token": token, "key": key, "value": value}
     
-    response = urequests.request(method = 'POST', url = url, data = None, json = thedata)
+    response = session.request(method = 'POST', url = url, data = None, json = thedata)
     
     response.close()
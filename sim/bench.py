@@ -0,0 +1,482 @@
+# Benchmarks for the firmware modules running on the simulated board.
+#
+#     python sim/bench.py                 # every benchmark
+#     python sim/bench.py -n 50 main_loop
+#     python sim/bench.py --list
+#
+# For each benchmark the table reports, per iteration (per 10 s of virtual
+# time for main_loop):
+#   device ms  busy time on the board (blocking waits and modelled bus time)
+#   host us    CPython wall time, useful only for relative comparisons
+#   i2c tx / i2c B   I2C transactions and bytes on the wire
+#   px B       bytes pushed to NeoPixel strips
+#   sock w / sock B  socket write calls and bytes written
+#   conn / dns       TCP connects and getaddrinfo lookups
+#   alloc B    peak heap growth within an iteration (tracemalloc)
+
+import contextlib
+import io
+import sys
+import time
+import tracemalloc
+
+import simulator
+
+BENCHMARKS = []
+
+
+def benchmark(name):
+    # Register ``setup``; it returns a callable run once per iteration.
+    def register(setup):
+        BENCHMARKS.append((name, setup))
+        return setup
+    return register
+
+
+class Sampler:
+
+    def __init__(self, trace):
+        self.trace = trace
+        self.rows = []
+
+    def begin(self, at_us=None):
+        self.clock = simulator.clock.now_us if at_us is None else at_us
+        self.i2c = (simulator.i2c_stats.transactions, simulator.i2c_stats.bytes)
+        self.pixels = simulator.neopixel_stats.bytes
+        self.sock = _socket_writes()
+        self.net = (_socket_count("connect"), _socket_count("getaddrinfo"))
+        if self.trace:
+            tracemalloc.reset_peak()
+            self.heap = tracemalloc.get_traced_memory()[0]
+        self.host = time.perf_counter()
+
+    def end(self, at_us=None, idle_us=0):
+        host = time.perf_counter() - self.host
+        alloc = 0
+        if self.trace:
+            alloc = tracemalloc.get_traced_memory()[1] - self.heap
+        if at_us is None:
+            at_us = simulator.clock.now_us
+        writes, written = _socket_writes()
+        self.rows.append((
+            (at_us - self.clock - idle_us) / 1000,
+            host * 1e6,
+            simulator.i2c_stats.transactions - self.i2c[0],
+            simulator.i2c_stats.bytes - self.i2c[1],
+            simulator.neopixel_stats.bytes - self.pixels,
+            writes - self.sock[0],
+            written - self.sock[1],
+            _socket_count("connect") - self.net[0],
+            _socket_count("getaddrinfo") - self.net[1],
+            alloc,
+        ))
+
+    def mean(self, column):
+        if not self.rows:
+            return 0
+        return sum(row[column] for row in self.rows) / len(self.rows)
+
+
+def _socket_writes():
+    entry = simulator.socket_stats.by_address.get("write", (0, 0))
+    return entry[0], entry[1]
+
+
+def _socket_count(op):
+    return simulator.socket_stats.by_address.get(op, (0,))[0]
+
+
+def measure(setup, iterations, trace):
+    simulator.default_devices()
+    simulator.reset_stats()
+    sampler = Sampler(trace)
+    with contextlib.redirect_stdout(io.StringIO()):
+        step = setup()
+        if step is None:
+            return sampler
+        for i in range(iterations):
+            sampler.begin()
+            step()
+            sampler.end()
+    return sampler
+
+
+def measure_script(path, iterations, trace, window_ms=10000):
+    # A script is sampled in fixed windows of virtual time, starting after
+    # its first long sleep (the start-up delay of main.py). Device time is
+    # the part of each window not spent idle.
+    simulator.default_devices()
+    simulator.reset_stats()
+    sampler = Sampler(trace)
+    window = window_ms * 1000
+    state = {"boundary": None, "idle": 0}
+
+    def on_idle(us):
+        now = simulator.clock.now_us
+        if state["boundary"] is None:
+            if us >= 1000000:
+                sampler.begin(now + us)
+                state["boundary"] = now + us + window
+            return
+        end = now + us
+        while end >= state["boundary"]:
+            boundary = state["boundary"]
+            sampler.end(boundary, state["idle"] + boundary - now)
+            if len(sampler.rows) >= iterations:
+                raise simulator.StopSimulation()
+            sampler.begin(boundary)
+            state["idle"] = 0
+            state["boundary"] = boundary + window
+            now = boundary
+        state["idle"] += end - now
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        simulator.run_script(path, on_idle=on_idle)
+    return sampler
+
+
+def run(names=None, iterations=20):
+    simulator.install()
+    header = "{0:<24}{1:>11}{2:>11}{3:>8}{4:>9}{5:>8}{6:>8}{7:>9}{8:>6}{9:>6}{10:>10}".format(
+        "benchmark", "device ms", "host us", "i2c tx", "i2c B", "px B",
+        "sock w", "sock B", "conn", "dns", "alloc B")
+    print(header)
+    print("-" * len(header))
+    for name, setup in BENCHMARKS:
+        if names and name not in names:
+            continue
+        timed = setup(iterations, False)
+        tracemalloc.start()
+        try:
+            traced = setup(iterations, True)
+        finally:
+            tracemalloc.stop()
+        print("{0:<24}{1:>11.2f}{2:>11.0f}{3:>8.1f}{4:>9.1f}{5:>8.1f}{6:>8.1f}{7:>9.1f}{8:>6.2f}{9:>6.2f}{10:>10.0f}".format(
+            name, timed.mean(0), timed.mean(1), timed.mean(2), timed.mean(3),
+            timed.mean(4), timed.mean(5), timed.mean(6), timed.mean(7),
+            timed.mean(8), traced.mean(9)))
+
+
+def steps(func):
+    # Adapt a setup returning a per-iteration callable to the runner.
+    def setup(iterations, trace):
+        return measure(func, iterations, trace)
+    return setup
+
+
+@benchmark("main_loop")
+def bench_main_loop(iterations, trace):
+    return measure_script(simulator.ROOT_DIR + "/main.py", iterations, trace)
+
+
+@benchmark("temperature_pro_read")
+@steps
+def bench_temperature_pro():
+    from sensors import TemperatureSensorPro
+    sensor = TemperatureSensorPro(3)
+
+    def step():
+        # force a fresh measurement instead of the cached reading
+        sensor.last_measure = None
+        sensor.get_data()
+    return step
+
+
+@benchmark("light_read")
+@steps
+def bench_light():
+    from sensors import LightSensor
+    sensor = LightSensor(6)
+
+    def step():
+        # max_age=0 reads the sensor instead of the cached reading
+        sensor.get_data(0)
+    return step
+
+
+@benchmark("light_read_continuous")
+@steps
+def bench_light_continuous():
+    from sensors import LightSensor
+    sensor = LightSensor(6)
+    sensor.continuous(True)
+
+    def step():
+        sensor.get_data(0)
+    return step
+
+
+@benchmark("light_show_and_upload")
+@steps
+def bench_light_show_and_upload():
+    # one cycle showing the light on the screen and collecting it for upload
+    import iot
+    from displays import OledScreen
+    from sensors import LightSensor
+    sensor = LightSensor(6)
+    screen = OledScreen(6)
+    bc = iot.BcServer("wa1")
+
+    def step():
+        # a new cycle: the last reading has gone stale
+        sensor.last_measure = None
+        sensor.show_data(screen, 1)
+        bc._sensor_to_data(sensor)
+    return step
+
+
+@benchmark("lux_batch_64")
+@steps
+def bench_lux_batch():
+    import array
+    from sensors import LightSensor
+    sensor = LightSensor(6)
+    raw = array.array("H", [1200, 300, 1180, 310, 1250, 290, 900, 260] * 16)
+    out = array.array("H", bytes(64 * 2))
+
+    def step():
+        sensor.lux_into(raw, out)
+    return step
+
+
+@benchmark("light_watch_idle")
+@steps
+def bench_light_watch():
+    # a second of steady light while watching for changes
+    from sensors import LightSensor
+    simulator.i2c_devices[0x29].int_gpio = 14
+    sensor = LightSensor()
+    sensor.watch(1)
+
+    def step():
+        time.sleep(1)
+    return step
+
+
+@benchmark("history_add_max_256")
+@steps
+def bench_history_add_max():
+    # a falling series evicts the maximum with every sample
+    from history import History
+    history = History(256)
+    value = [1000.0]
+
+    def step():
+        value[0] -= 0.5
+        history.add(value[0])
+        history.max()
+    return step
+
+
+@benchmark("moisture_read")
+@steps
+def bench_moisture():
+    from sensors import MoistureSensor
+    sensor = MoistureSensor(4)
+
+    def step():
+        sensor.get_data(0)
+    return step
+
+
+@benchmark("oled_show_line")
+@steps
+def bench_oled_show_line():
+    from displays import OledScreen
+    screen = OledScreen(6)
+    count = [0]
+
+    def step():
+        count[0] += 1
+        screen.show_line(1, ">3: {0}F".format(70 + count[0] % 10))
+    return step
+
+
+@benchmark("oled_clear_line")
+@steps
+def bench_oled_clear_line():
+    from displays import OledScreen
+    screen = OledScreen(6)
+    count = [0]
+
+    def step():
+        count[0] += 1
+        screen.clear_line(1 + count[0] % screen.max_line)
+        screen.show()
+    return step
+
+
+@benchmark("ssd1327_clear_line")
+@steps
+def bench_ssd1327_clear_line():
+    import devices
+    from ssd1327 import SEEED_OLED_96X96
+    from wio_link import i2c
+    simulator.detach_i2c(0x3c)
+    simulator.attach_i2c(devices.SSD1327(0x3c))
+    screen = SEEED_OLED_96X96(i2c)
+    # clear_line() marks its rows, so only those are sent
+    screen.partial = True
+    count = [0]
+
+    def step():
+        count[0] += 1
+        screen.clear_line(1 + count[0] % 12)
+        screen.show()
+    return step
+
+
+@benchmark("growlight_on_off")
+@steps
+def bench_growlight():
+    from displays import GrowLight
+    light = GrowLight(2)
+
+    def step():
+        light.on()
+        light.off()
+    return step
+
+
+@benchmark("growlight_cycle_frame")
+@steps
+def bench_growlight_frame():
+    from displays import GrowLight
+    light = GrowLight(2)
+    light._start("cycle", None)
+
+    def step():
+        light.step()
+    return step
+
+
+@benchmark("pwm_ramp_tick")
+@steps
+def bench_ramp_tick():
+    from actuators import Servo, ramps
+    from displays import Led
+    led = Led(1)
+    servo = Servo(2)
+
+    def step():
+        # one tick of a led fade and a servo sweep
+        if not ramps.active:
+            led.fade_to(0 if led.led.duty() else 1023, duration=10)
+            servo.set_position(180 - servo.get_position(), duration=10)
+        ramps.tick()
+    return step
+
+
+def _uplink(batch):
+    import iot
+    from sensors import TemperatureSensorPro
+    from standin import StandIn
+    server = StandIn()
+    bc = iot.BcServer("wa1", batch=batch)
+    bc.ip = "127.0.0.1"
+    bc.port = server.port
+    sensor = TemperatureSensorPro(3)
+
+    def step():
+        bc.last = None
+        sensor.last_measure = None
+        bc.send_sensor_data(sensor, debug=False)
+    return step
+
+
+@benchmark("uplink_single")
+@steps
+def bench_uplink_single():
+    return _uplink(0)
+
+
+@benchmark("uplink_batched_6")
+@steps
+def bench_uplink_batched():
+    return _uplink(6)
+
+
+def _http_post(session):
+    # one JSON POST with two custom headers, as sent by NodeRed
+    import urequests
+    from standin import StandIn
+    server = StandIn()
+    client = urequests.Session() if session else urequests
+    url = "http://127.0.0.1:%d/sensors" % server.port
+    headers = {"X-Device": "wiolink", "Accept": "application/json"}
+    data = {"temperature": 71.6, "humidity": 40.2, "lux": 112}
+
+    def step():
+        client.post(url, json=data, headers=headers).close()
+    return step
+
+
+@benchmark("http_post")
+@steps
+def bench_http_post():
+    return _http_post(False)
+
+
+@benchmark("http_post_session")
+@steps
+def bench_http_post_session():
+    return _http_post(True)
+
+
+def _mqtt(many, qos=0):
+    # one sample's worth of readings published as five topics
+    from umqtt.simple import MQTTClient
+    from standin import MqttStandIn
+    server = MqttStandIn()
+    client = MQTTClient("wiolink", "127.0.0.1", server.port)
+    client.connect()
+    msgs = [("wiolink/temperature", "71.6"), ("wiolink/humidity", "40.2"),
+            ("wiolink/lux", "112"), ("wiolink/moisture", "433"), ("wiolink/relay", "0")]
+
+    def step():
+        if many:
+            client.publish_many(msgs, qos=qos)
+        else:
+            for topic, msg in msgs:
+                client.publish(topic, msg, qos=qos)
+        if qos:
+            client.wait_inflight()
+    return step
+
+
+@benchmark("mqtt_publish_5")
+@steps
+def bench_mqtt_publish():
+    return _mqtt(False)
+
+
+@benchmark("mqtt_publish_many_5")
+@steps
+def bench_mqtt_publish_many():
+    return _mqtt(True)
+
+
+@benchmark("mqtt_publish_qos1_5")
+@steps
+def bench_mqtt_publish_qos1():
+    return _mqtt(False, 1)
+
+
+def main(argv):
+    iterations = 20
+    names = []
+    args = iter(argv[1:])
+    for arg in args:
+        if arg == "-n":
+            iterations = int(next(args))
+        elif arg == "--list":
+            for name, setup in BENCHMARKS:
+                print(name)
+            return
+        else:
+            names.append(arg)
+    run(names, iterations)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
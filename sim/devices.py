@@ -0,0 +1,290 @@
+# Register-level models of the I2C peripherals used with the Wio Link.
+#
+# A device sees the bus the way the real chip does: ``write`` receives the
+# bytes of one write transaction (after the address byte) and ``read``
+# returns the bytes clocked out by one read transaction.
+
+import simulator
+
+_TSL_INTEGRATION_US = (13700, 101000, 402000)
+_TSL_INTEGRATION_SCALE = (0.034, 0.252, 1.0)
+_TSL_CLIP = (5047, 37177, 65535)
+
+
+class TSL2561:
+    # Scripted readings are (broadband, ir) counts at 1x gain and 402 ms
+    # integration; the model scales them to the configured timing.
+    #
+    # With the level interrupt enabled the chip converts continuously, off
+    # a simulator timer, and pulls the GPIO numbered int_gpio low once
+    # channel 0 has been outside the thresholds for the persistence count,
+    # until the interrupt is cleared.
+
+    def __init__(self, address=0x39, readings=None):
+        self.address = address
+        self.regs = bytearray(16)
+        self.regs[0x0A] = 0x50
+        self.regs[0x01] = 0x02
+        self.pointer = 0
+        self.readings = simulator.script(readings or [(1200, 300), (1180, 310), (1250, 290), (900, 260)])
+        self.powered_at = None
+        self.conversions = 0
+        self.int_gpio = None
+        self.int_asserted = False
+        self.interrupts = 0
+        self._outside = 0
+        self._ticker = None
+
+    def _interrupt_enabled(self):
+        return (self.regs[0x06] >> 4) & 0x03 == 0x01
+
+    def _int_level(self, level):
+        import machine
+        pin = machine.Pin.pins.get(self.int_gpio)
+        if pin is not None:
+            pin.set_level(level)
+
+    def _check_threshold(self, broadband):
+        low = self.regs[0x02] | self.regs[0x03] << 8
+        high = self.regs[0x04] | self.regs[0x05] << 8
+        persist = self.regs[0x06] & 0x0f
+        if broadband < low or broadband > high:
+            self._outside += 1
+        else:
+            self._outside = 0
+        if (persist == 0 or self._outside >= persist) and not self.int_asserted:
+            self.int_asserted = True
+            self.interrupts += 1
+            self._int_level(0)
+
+    def _arm(self):
+        import machine
+        period = self._integration_us()
+        if self.powered_at is not None and period and self._interrupt_enabled():
+            if self._ticker is None:
+                self._ticker = machine.Timer(-1)
+            self._ticker.init(period=period / 1000, mode=machine.Timer.PERIODIC,
+                              callback=lambda t: self._update())
+        elif self._ticker is not None:
+            self._ticker.deinit()
+            self._ticker = None
+
+    def _integration_us(self):
+        timing = self.regs[0x01] & 0x03
+        if timing == 3:
+            return None
+        return _TSL_INTEGRATION_US[timing]
+
+    def _convert(self):
+        timing = self.regs[0x01] & 0x03
+        broadband, ir = simulator.read_script(self.readings)
+        if timing != 3:
+            scale = _TSL_INTEGRATION_SCALE[timing]
+            if self.regs[0x01] & 0x10:
+                scale *= 16
+            clip = _TSL_CLIP[timing]
+            broadband = min(clip, int(broadband * scale))
+            ir = min(clip, int(ir * scale))
+        self.regs[0x0C] = broadband & 0xff
+        self.regs[0x0D] = broadband >> 8
+        self.regs[0x0E] = ir & 0xff
+        self.regs[0x0F] = ir >> 8
+        if self._interrupt_enabled():
+            self._check_threshold(broadband)
+
+    def _update(self):
+        if self.powered_at is None:
+            return
+        period = self._integration_us()
+        if period is None:
+            return
+        done = (simulator.clock.now_us - self.powered_at) // period
+        if done > self.conversions and self._interrupt_enabled():
+            # every conversion counts towards the persistence
+            while self.conversions < done:
+                self.conversions += 1
+                self._convert()
+        elif done > self.conversions:
+            self.conversions = done
+            self._convert()
+
+    def _set_register(self, reg, value):
+        if reg == 0x00:
+            powered = value & 0x03 == 0x03
+            if powered and self.powered_at is None:
+                self.powered_at = simulator.clock.now_us
+                self.conversions = 0
+            elif not powered:
+                self.powered_at = None
+        elif reg == 0x01 and self.powered_at is not None:
+            # changing timing or gain restarts the integration cycle
+            self.powered_at = simulator.clock.now_us
+            self.conversions = 0
+        if reg != 0x0A:
+            self.regs[reg] = value
+        if reg in (0x00, 0x01, 0x06):
+            if reg == 0x06:
+                self._outside = 0
+            self._arm()
+
+    def write(self, data):
+        if not data:
+            return
+        command = data[0]
+        if command & 0x40:
+            self.clear_interrupt()
+        self.pointer = command & 0x0f
+        for value in data[1:]:
+            self._set_register(self.pointer, value)
+            self.pointer = (self.pointer + 1) & 0x0f
+
+    def read(self, n):
+        self._update()
+        out = bytearray(n)
+        for i in range(n):
+            out[i] = self.regs[self.pointer]
+            self.pointer = (self.pointer + 1) & 0x0f
+        return bytes(out)
+
+    def detached(self):
+        if self._ticker is not None:
+            self._ticker.deinit()
+            self._ticker = None
+
+    def clear_interrupt(self):
+        if self.int_asserted:
+            self.int_asserted = False
+            self._int_level(1)
+
+
+_SSD1306_ARGS = {
+    0x20: 1, 0x21: 2, 0x22: 2, 0x81: 1, 0x8d: 1, 0xa8: 1,
+    0xd3: 1, 0xd5: 1, 0xd9: 1, 0xda: 1, 0xdb: 1,
+}
+
+
+class SSD1306:
+    # Keeps a copy of the controller's display RAM so that callers can
+    # check what actually reached the panel.
+
+    def __init__(self, address=0x3c, width=128, height=64):
+        self.address = address
+        self.width = width
+        self.pages = height // 8
+        self.ram = bytearray(self.width * self.pages)
+        self.commands = 0
+        self.data_bytes = 0
+        self._cmd = None
+        self._args = []
+        self.col_start = self.col = 0
+        self.col_end = width - 1
+        self.page_start = self.page = 0
+        self.page_end = self.pages - 1
+
+    def _command(self, byte):
+        if self._cmd is None:
+            self.commands += 1
+            if _SSD1306_ARGS.get(byte, 0):
+                self._cmd = byte
+                self._args = []
+            return
+        self._args.append(byte)
+        if len(self._args) < _SSD1306_ARGS[self._cmd]:
+            return
+        if self._cmd == 0x21:
+            self.col_start = self.col = self._args[0] % self.width
+            self.col_end = self._args[1] % self.width
+        elif self._cmd == 0x22:
+            self.page_start = self.page = self._args[0] % self.pages
+            self.page_end = self._args[1] % self.pages
+        self._cmd = None
+
+    def _data(self, data):
+        self.data_bytes += len(data)
+        for byte in data:
+            self.ram[self.page * self.width + self.col] = byte
+            if self.col < self.col_end:
+                self.col += 1
+                continue
+            self.col = self.col_start
+            self.page = self.page + 1 if self.page < self.page_end else self.page_start
+
+    def write(self, data):
+        if not data:
+            return
+        control = data[0]
+        if control & 0x40:
+            self._data(data[1:])
+        elif control & 0x80:
+            for i in range(1, len(data), 2):
+                self._command(data[i])
+        else:
+            for byte in data[1:]:
+                self._command(byte)
+
+    def read(self, n):
+        return bytes(n)
+
+
+_SSD1327_ARGS = {
+    0x15: 2, 0x75: 2, 0x81: 1, 0xa0: 1, 0xa1: 1, 0xa2: 1, 0xa8: 1, 0xab: 1,
+    0xb1: 1, 0xb3: 1, 0xb6: 1, 0xb8: 15, 0xbc: 1, 0xbe: 1, 0xd5: 1, 0xfd: 1,
+}
+
+
+class SSD1327:
+    # Grayscale controller with 128x128 pixels of 4 bits, two per byte. The
+    # column window counts bytes (0-63) and the row window rows (0-127).
+
+    def __init__(self, address=0x3c):
+        self.address = address
+        self.ram = bytearray(64 * 128)
+        self.commands = 0
+        self.data_bytes = 0
+        self._cmd = None
+        self._args = []
+        self.col_start = self.col = 0
+        self.col_end = 63
+        self.row_start = self.row = 0
+        self.row_end = 127
+
+    def _command(self, byte):
+        if self._cmd is None:
+            self.commands += 1
+            if _SSD1327_ARGS.get(byte, 0):
+                self._cmd = byte
+                self._args = []
+            return
+        self._args.append(byte)
+        if len(self._args) < _SSD1327_ARGS[self._cmd]:
+            return
+        if self._cmd == 0x15:
+            self.col_start = self.col = self._args[0] & 0x3f
+            self.col_end = self._args[1] & 0x3f
+        elif self._cmd == 0x75:
+            self.row_start = self.row = self._args[0] & 0x7f
+            self.row_end = self._args[1] & 0x7f
+        self._cmd = None
+
+    def _data(self, data):
+        self.data_bytes += len(data)
+        for byte in data:
+            self.ram[self.row * 64 + self.col] = byte
+            if self.col < self.col_end:
+                self.col += 1
+                continue
+            self.col = self.col_start
+            self.row = self.row + 1 if self.row < self.row_end else self.row_start
+
+    def window(self, x0, y0, width, height):
+        # the bytes shown for a width x height panel whose window starts at
+        # byte column x0 and row y0, row by row
+        out = bytearray()
+        for y in range(y0, y0 + height):
+            out.extend(self.ram[y * 64 + x0:y * 64 + x0 + width // 2])
+        return bytes(out)
+
+    write = SSD1306.write
+
+    def read(self, n):
+        return bytes(n)
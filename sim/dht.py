@@ -0,0 +1,40 @@
+# Simulated DHT11/DHT22 drivers returning scripted (celsius, humidity) pairs.
+
+import simulator
+
+
+class DHTBase:
+    # time the single-wire start pulse and 40-bit transfer keep the CPU busy
+    MEASURE_US = 5000
+
+    def __init__(self, pin):
+        self.pin = pin
+        self.buf = bytearray(5)
+        self.measurements = 0
+        self._temperature = 0
+        self._humidity = 0
+
+    def measure(self):
+        simulator.clock.advance_us(self.MEASURE_US)
+        self._temperature, self._humidity = simulator.read_script(simulator.dht_readings)
+        self.measurements += 1
+
+
+class DHT11(DHTBase):
+    MEASURE_US = 23000
+
+    def humidity(self):
+        return int(self._humidity)
+
+    def temperature(self):
+        return int(self._temperature)
+
+
+class DHT22(DHTBase):
+    MEASURE_US = 6000
+
+    def humidity(self):
+        return round(self._humidity, 1)
+
+    def temperature(self):
+        return round(self._temperature, 1)
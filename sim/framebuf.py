@@ -0,0 +1,153 @@
+# Pure-Python FrameBuffer with the MicroPython framebuf API. Glyphs are
+# synthetic 8x8 patterns rather than the firmware's font: the simulator
+# cares about which bytes change and travel over the bus, not legibility.
+
+MONO_VLSB = 0
+MVLSB = MONO_VLSB
+RGB565 = 1
+GS4_HMSB = 2
+MONO_HLSB = 3
+MONO_HMSB = 4
+GS8 = 6
+
+
+def _glyph(c):
+    code = ord(c)
+    if code <= 32 or code > 126:
+        return bytes(8)
+    return bytes([0] + [((code * 37 + j * 11) & 0x7e) | 0x02 for j in range(6)] + [0])
+
+
+class FrameBuffer:
+
+    def __init__(self, buffer, width, height, format, stride=None):
+        self.buf = buffer
+        self.width = width
+        self.height = height
+        self.format = format
+        self.stride = width if stride is None else stride
+        if format not in (MONO_VLSB, GS4_HMSB, MONO_HLSB, MONO_HMSB, GS8):
+            raise ValueError("invalid format")
+
+    def _set(self, x, y, c):
+        buf = self.buf
+        fmt = self.format
+        if fmt == MONO_VLSB:
+            i = (y >> 3) * self.stride + x
+            bit = 1 << (y & 7)
+            buf[i] = (buf[i] | bit) if c else (buf[i] & ~bit & 0xff)
+        elif fmt == GS4_HMSB:
+            i = (x + y * self.stride) >> 1
+            if x & 1:
+                buf[i] = (c & 0x0f) | (buf[i] & 0xf0)
+            else:
+                buf[i] = ((c & 0x0f) << 4) | (buf[i] & 0x0f)
+        elif fmt == GS8:
+            buf[x + y * self.stride] = c & 0xff
+        else:
+            i = (x + y * self.stride) >> 3
+            bit = (0x80 >> (x & 7)) if fmt == MONO_HLSB else (1 << (x & 7))
+            buf[i] = (buf[i] | bit) if c else (buf[i] & ~bit & 0xff)
+
+    def _get(self, x, y):
+        buf = self.buf
+        fmt = self.format
+        if fmt == MONO_VLSB:
+            return (buf[(y >> 3) * self.stride + x] >> (y & 7)) & 1
+        if fmt == GS4_HMSB:
+            b = buf[(x + y * self.stride) >> 1]
+            return b & 0x0f if x & 1 else b >> 4
+        if fmt == GS8:
+            return buf[x + y * self.stride]
+        b = buf[(x + y * self.stride) >> 3]
+        bit = (0x80 >> (x & 7)) if fmt == MONO_HLSB else (1 << (x & 7))
+        return 1 if b & bit else 0
+
+    def pixel(self, x, y, c=None):
+        if not (0 <= x < self.width and 0 <= y < self.height):
+            return None
+        if c is None:
+            return self._get(x, y)
+        self._set(x, y, c)
+
+    def fill_rect(self, x, y, w, h, c):
+        x0 = max(0, x)
+        y0 = max(0, y)
+        x1 = min(self.width, x + w)
+        y1 = min(self.height, y + h)
+        for yy in range(y0, y1):
+            for xx in range(x0, x1):
+                self._set(xx, yy, c)
+
+    def fill(self, c):
+        fmt = self.format
+        if fmt == MONO_VLSB or fmt in (MONO_HLSB, MONO_HMSB):
+            value = 0xff if c else 0
+        elif fmt == GS4_HMSB:
+            value = (c & 0x0f) * 0x11
+        else:
+            value = c & 0xff
+        for i in range(len(self.buf)):
+            self.buf[i] = value
+
+    def hline(self, x, y, w, c):
+        self.fill_rect(x, y, w, 1, c)
+
+    def vline(self, x, y, h, c):
+        self.fill_rect(x, y, 1, h, c)
+
+    def rect(self, x, y, w, h, c):
+        self.hline(x, y, w, c)
+        self.hline(x, y + h - 1, w, c)
+        self.vline(x, y, h, c)
+        self.vline(x + w - 1, y, h, c)
+
+    def line(self, x0, y0, x1, y1, c):
+        dx = abs(x1 - x0)
+        dy = -abs(y1 - y0)
+        sx = 1 if x0 < x1 else -1
+        sy = 1 if y0 < y1 else -1
+        err = dx + dy
+        while True:
+            self.pixel(x0, y0, c)
+            if x0 == x1 and y0 == y1:
+                return
+            e2 = 2 * err
+            if e2 >= dy:
+                err += dy
+                x0 += sx
+            if e2 <= dx:
+                err += dx
+                y0 += sy
+
+    def text(self, s, x, y, c=1):
+        for ch in s:
+            glyph = _glyph(ch)
+            for col in range(8):
+                bits = glyph[col]
+                xx = x + col
+                for row in range(8):
+                    if bits & (1 << row):
+                        self.pixel(xx, y + row, c)
+            x += 8
+
+    def scroll(self, dx, dy):
+        xs = range(self.width - 1, -1, -1) if dx > 0 else range(self.width)
+        ys = range(self.height - 1, -1, -1) if dy > 0 else range(self.height)
+        for y in ys:
+            for x in xs:
+                sx = x - dx
+                sy = y - dy
+                if 0 <= sx < self.width and 0 <= sy < self.height:
+                    self._set(x, y, self._get(sx, sy))
+
+    def blit(self, fbuf, x, y, key=-1):
+        for sy in range(fbuf.height):
+            for sx in range(fbuf.width):
+                c = fbuf._get(sx, sy)
+                if c != key:
+                    self.pixel(x + sx, y + sy, c)
+
+
+def FrameBuffer1(buffer, width, height, stride=None):
+    return FrameBuffer(buffer, width, height, MONO_VLSB, stride)
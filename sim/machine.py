@@ -0,0 +1,263 @@
+# Simulated subset of the MicroPython ``machine`` module for the ESP8266.
+
+import simulator
+
+
+def freq(value=None):
+    if value is None:
+        return 80000000
+
+
+def reset():
+    raise simulator.StopSimulation("machine.reset()")
+
+
+def idle():
+    pass
+
+
+def unique_id():
+    return b"\x00\x11\x22\x33"
+
+
+def disable_irq():
+    return 0
+
+
+def enable_irq(state=0):
+    pass
+
+
+class Pin:
+    IN = 0
+    OUT = 1
+    OPEN_DRAIN = 2
+    PULL_UP = 1
+    IRQ_RISING = 1
+    IRQ_FALLING = 2
+
+    # pin number -> Pin, so that tests can drive inputs from outside
+    pins = {}
+
+    def __init__(self, id, mode=-1, pull=-1, value=None):
+        self.id = id
+        self.mode = mode
+        self.pull = pull
+        self._value = 1 if pull == Pin.PULL_UP else 0
+        self._handler = None
+        self._trigger = 0
+        if value is not None:
+            self._value = value
+        Pin.pins[id] = self
+
+    def init(self, mode=-1, pull=-1, value=None):
+        if mode != -1:
+            self.mode = mode
+        if pull != -1:
+            self.pull = pull
+        if value is not None:
+            self._value = value
+
+    def value(self, value=None):
+        if value is None:
+            return self._value
+        self.set_level(value)
+
+    def __call__(self, value=None):
+        return self.value(value)
+
+    def on(self):
+        self.value(1)
+
+    def off(self):
+        self.value(0)
+
+    def irq(self, trigger=IRQ_RISING | IRQ_FALLING, handler=None):
+        self._trigger = trigger
+        self._handler = handler
+
+    def set_level(self, value):
+        # Drive the pin level, firing the IRQ handler on matching edges.
+        value = 1 if value else 0
+        old = self._value
+        self._value = value
+        if self._handler is None or old == value:
+            return
+        if (value and self._trigger & Pin.IRQ_RISING) or (not value and self._trigger & Pin.IRQ_FALLING):
+            self._handler(self)
+
+    def __repr__(self):
+        return "Pin({0})".format(self.id)
+
+
+class ADC:
+
+    def __init__(self, id):
+        self.id = id
+
+    def read(self):
+        simulator.clock.advance_us(100)
+        return simulator.read_script(simulator.adc_readings)
+
+
+class PWM:
+
+    def __init__(self, pin, freq=None, duty=None):
+        self.pin = pin
+        self._freq = 1000
+        self._duty = 0
+        self.writes = 0
+        self.active = False
+        self.init(freq=freq, duty=duty)
+
+    def init(self, freq=None, duty=None):
+        if freq is not None:
+            self._freq = freq
+        if duty is not None:
+            self._duty = duty
+        self.active = True
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self.active = True
+        self._freq = value
+        self.writes += 1
+
+    def duty(self, value=None):
+        if value is None:
+            return self._duty
+        self.active = True
+        self._duty = value
+        self.writes += 1
+
+    def deinit(self):
+        self.active = False
+
+
+class I2C:
+    # Software I2C. Each transaction charges the bus time of its bytes
+    # (8 data bits + ACK per byte) plus start/stop overhead to the
+    # virtual clock and the shared bus statistics.
+
+    OVERHEAD_US = 20
+
+    def __init__(self, id=-1, scl=None, sda=None, freq=100000):
+        self.scl = scl
+        self.sda = sda
+        self.freq = freq
+        self._raw_address = None
+        self._raw_data = None
+
+    def init(self, scl=None, sda=None, freq=100000):
+        if scl is not None:
+            self.scl = scl
+        if sda is not None:
+            self.sda = sda
+        self.freq = freq
+
+    def _charge(self, address, nbytes, error=False):
+        us = self.OVERHEAD_US + nbytes * 9 * 1000000 // self.freq
+        simulator.clock.advance_us(us)
+        simulator.i2c_stats.record(address, nbytes, us, error)
+
+    def _device(self, address, nbytes):
+        device = simulator.i2c_devices.get(address)
+        self._charge(address, nbytes, device is None)
+        if device is None:
+            raise OSError(19)
+        return device
+
+    def scan(self):
+        found = []
+        for address in range(0x08, 0x78):
+            self._charge(address, 1, False)
+            if address in simulator.i2c_devices:
+                found.append(address)
+        return found
+
+    def start(self):
+        self._raw_address = None
+        self._raw_data = bytearray()
+
+    def stop(self):
+        if self._raw_data is None:
+            return
+        address = self._raw_address
+        data = self._raw_data
+        self._raw_address = None
+        self._raw_data = None
+        if address is None:
+            return
+        device = simulator.i2c_devices.get(address)
+        self._charge(address, 1 + len(data), device is None)
+        if device is not None:
+            device.write(bytes(data))
+
+    def write(self, buf):
+        if self._raw_data is None:
+            raise OSError(5)
+        buf = bytes(buf)
+        if self._raw_address is None and buf:
+            self._raw_address = buf[0] >> 1
+            buf = buf[1:]
+        self._raw_data.extend(buf)
+        if self._raw_address not in simulator.i2c_devices:
+            return 0
+        return len(buf) + 1
+
+    def readinto(self, buf, nack=True):
+        buf[:] = bytes(len(buf))
+
+    def writeto(self, addr, buf, stop=True):
+        buf = bytes(buf)
+        self._device(addr, 1 + len(buf)).write(buf)
+        return len(buf)
+
+    def readfrom(self, addr, nbytes, stop=True):
+        return self._device(addr, 1 + nbytes).read(nbytes)
+
+    def readfrom_into(self, addr, buf, stop=True):
+        buf[:] = self.readfrom(addr, len(buf), stop)
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        buf = bytes(buf)
+        self._device(addr, 2 + len(buf)).write(bytes((memaddr,)) + buf)
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        device = self._device(addr, 3 + nbytes)
+        device.write(bytes((memaddr,)))
+        return device.read(nbytes)
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        buf[:] = self.readfrom_mem(addr, memaddr, len(buf), addrsize)
+
+
+class Timer:
+    ONE_SHOT = 0
+    PERIODIC = 1
+
+    # Armed timers fire from the simulator clock as virtual time passes.
+
+    def __init__(self, id=-1):
+        self.id = id
+        self._callback = None
+
+    def init(self, mode=PERIODIC, period=-1, callback=None):
+        self.deinit()
+        self.mode = mode
+        self.period = period
+        self._callback = callback
+        self.deadline = simulator.clock.now_us + period * 1000
+        simulator.timers.append(self)
+
+    def deinit(self):
+        if self in simulator.timers:
+            simulator.timers.remove(self)
+
+    def _fire(self):
+        if self.mode == Timer.PERIODIC:
+            self.deadline += self.period * 1000
+        else:
+            self.deinit()
+        self._callback(self)
@@ -0,0 +1,31 @@
+import simulator
+
+
+def const(x):
+    return x
+
+
+def schedule(func, arg):
+    if len(simulator.scheduled) >= 8:
+        raise RuntimeError("schedule queue full")
+    simulator.scheduled.append((func, arg))
+
+
+def alloc_emergency_exception_buf(size):
+    pass
+
+
+def mem_info(verbose=False):
+    print("simulated heap")
+
+
+def opt_level(level=None):
+    return 0
+
+
+def heap_lock():
+    pass
+
+
+def heap_unlock():
+    pass
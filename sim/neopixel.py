@@ -0,0 +1,36 @@
+# Simulated neopixel module, matching the MicroPython 1.9 driver API.
+
+import simulator
+
+
+class NeoPixel:
+    ORDER = (1, 0, 2, 3)
+
+    def __init__(self, pin, n, bpp=3, timing=1):
+        self.pin = pin
+        self.n = n
+        self.bpp = bpp
+        self.buf = bytearray(n * bpp)
+        self.timing = timing
+        self.writes = 0
+
+    def __setitem__(self, index, val):
+        offset = index * self.bpp
+        for i in range(self.bpp):
+            self.buf[offset + self.ORDER[i]] = val[i]
+
+    def __getitem__(self, index):
+        offset = index * self.bpp
+        return tuple(self.buf[offset + self.ORDER[i]]
+                     for i in range(self.bpp))
+
+    def fill(self, color):
+        for i in range(self.n):
+            self[i] = color
+
+    def write(self):
+        # 1.25 us per bit at 800 kHz plus the 50 us latch reset
+        us = len(self.buf) * 10 + 50
+        simulator.clock.advance_us(us)
+        simulator.neopixel_stats.record(self.pin.id, len(self.buf), us)
+        self.writes += 1
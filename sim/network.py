@@ -0,0 +1,91 @@
+# Simulated network module. Stations associate after CONNECT_MS of
+# virtual time; sockets use the host network stack (see usocket.py).
+
+import simulator
+
+STA_IF = 0
+AP_IF = 1
+
+AUTH_OPEN = 0
+AUTH_WEP = 1
+AUTH_WPA_PSK = 2
+AUTH_WPA2_PSK = 3
+AUTH_WPA_WPA2_PSK = 4
+
+STAT_IDLE = 0
+STAT_CONNECTING = 1
+STAT_WRONG_PASSWORD = 2
+STAT_NO_AP_FOUND = 3
+STAT_CONNECT_FAIL = 4
+STAT_GOT_IP = 5
+
+CONNECT_MS = 2000
+
+# SSIDs visible to the simulated radio: ssid -> password (None when open)
+access_points = {}
+
+
+class WLAN:
+    _interfaces = {}
+
+    def __new__(cls, interface=STA_IF):
+        wlan = cls._interfaces.get(interface)
+        if wlan is None:
+            wlan = object.__new__(cls)
+            wlan.interface = interface
+            wlan._active = interface == AP_IF
+            wlan._ssid = None
+            wlan._connected_at = None
+            wlan._status = STAT_IDLE
+            wlan._config = {"essid": "", "mac": b"\x18\xfe\x34\x00\x11\x22"}
+            cls._interfaces[interface] = wlan
+        return wlan
+
+    def active(self, value=None):
+        if value is None:
+            return self._active
+        self._active = bool(value)
+        if not self._active:
+            self.disconnect()
+
+    def connect(self, ssid=None, password=None):
+        if ssid in access_points and access_points[ssid] not in (None, password):
+            self._status = STAT_WRONG_PASSWORD
+            return
+        self._ssid = ssid
+        self._status = STAT_CONNECTING
+        self._connected_at = simulator.clock.now_us + CONNECT_MS * 1000
+
+    def disconnect(self):
+        self._connected_at = None
+        self._status = STAT_IDLE
+
+    def status(self):
+        if self._status == STAT_CONNECTING and self.isconnected():
+            self._status = STAT_GOT_IP
+        return self._status
+
+    def isconnected(self):
+        return (self._active and self._connected_at is not None
+                and simulator.clock.now_us >= self._connected_at)
+
+    def ifconfig(self, config=None):
+        if config is not None:
+            return
+        if self.interface == AP_IF:
+            return ("192.168.4.1", "255.255.255.0", "192.168.4.1", "208.67.222.222")
+        if not self.isconnected():
+            return ("0.0.0.0", "0.0.0.0", "0.0.0.0", "0.0.0.0")
+        return ("192.168.1.50", "255.255.255.0", "192.168.1.1", "192.168.1.1")
+
+    def scan(self):
+        result = []
+        for ssid in access_points:
+            authmode = AUTH_OPEN if access_points[ssid] is None else AUTH_WPA2_PSK
+            result.append((ssid.encode(), b"\x00\x00\x00\x00\x00\x00", 6, -60, authmode, False))
+        return result
+
+    def config(self, *args, **kwargs):
+        if args:
+            return self._config[args[0]]
+        self._config.update(kwargs)
@@ -0,0 +1,23 @@
+# Run a firmware script on the simulated board:
+#
+#     python sim/run.py                  # main.py, forever
+#     python sim/run.py main.py 3600     # one hour of virtual time
+
+import sys
+
+import simulator
+
+
+def main(argv):
+    path = argv[1] if len(argv) > 1 else simulator.ROOT_DIR + "/main.py"
+    seconds = float(argv[2]) if len(argv) > 2 else None
+
+    def on_idle(us):
+        if seconds is not None and simulator.clock.now_us + us > seconds * 1000000:
+            raise simulator.StopSimulation()
+
+    simulator.run_script(path, on_idle=on_idle)
+
+
+if __name__ == "__main__":
+    main(sys.argv)
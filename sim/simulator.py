@@ -0,0 +1,244 @@
+# Host-side simulation of the Wio Link board.
+#
+# The modules in this folder stand in for the MicroPython built-ins
+# (machine, dht, neopixel, network, usocket, utime, framebuf, ...) so the
+# firmware modules in the repository root run unmodified under CPython.
+# Time is virtual: sleeps and modelled bus latency advance the clock
+# instead of blocking, so a 10 second sample loop runs in microseconds.
+
+import builtins
+import os
+import sys
+import time
+
+SIM_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(SIM_DIR)
+
+TICKS_PERIOD = 1 << 30
+TICKS_MAX = TICKS_PERIOD - 1
+TICKS_HALFPERIOD = TICKS_PERIOD // 2
+
+
+class StopSimulation(Exception):
+    pass
+
+
+class Clock:
+
+    def __init__(self):
+        self.now_us = 0
+        self.on_sleep = None
+
+    def advance_us(self, us):
+        # Timer callbacks and scheduled functions run as the clock passes
+        # their deadlines, like interrupts arriving during a busy wait.
+        target = self.now_us + int(us)
+        while timers:
+            timer = min(timers, key=_deadline)
+            if timer.deadline > target:
+                break
+            self.now_us = max(self.now_us, timer.deadline)
+            timer._fire()
+        self.now_us = max(self.now_us, target)
+        run_scheduled()
+
+    def sleep_us(self, us):
+        if self.on_sleep is not None:
+            self.on_sleep(us, False)
+        self.advance_us(max(0, us))
+
+    def idle_us(self, us):
+        # the scheduler has nothing to run until ``us`` from now
+        if self.on_sleep is not None:
+            self.on_sleep(us, True)
+        self.advance_us(max(0, us))
+
+    def sleep_ms(self, ms):
+        self.sleep_us(ms * 1000)
+
+    def sleep(self, seconds):
+        self.sleep_us(seconds * 1000000)
+
+    def ticks_us(self):
+        return self.now_us & TICKS_MAX
+
+    def ticks_ms(self):
+        return (self.now_us // 1000) & TICKS_MAX
+
+    def ticks_cpu(self):
+        return self.ticks_us()
+
+    def time(self):
+        return self.now_us // 1000000
+
+
+def ticks_add(ticks, delta):
+    return (ticks + delta) & TICKS_MAX
+
+
+def ticks_diff(end, start):
+    return ((end - start + TICKS_HALFPERIOD) & TICKS_MAX) - TICKS_HALFPERIOD
+
+
+def _deadline(timer):
+    return timer.deadline
+
+
+# Armed machine.Timer objects and functions queued by micropython.schedule.
+timers = []
+scheduled = []
+
+
+def run_scheduled():
+    while scheduled:
+        func, arg = scheduled.pop(0)
+        func(arg)
+
+
+clock = Clock()
+
+
+class Script:
+    # Endless source of scripted readings. Values are replayed in order
+    # and the last one is held once the list is exhausted, unless
+    # ``loop`` is set.
+
+    def __init__(self, values, loop=True):
+        self.values = list(values)
+        self.loop = loop
+        self.index = 0
+
+    def next(self):
+        value = self.values[min(self.index, len(self.values) - 1)]
+        self.index += 1
+        if self.loop and self.index >= len(self.values):
+            self.index = 0
+        return value
+
+
+def script(values, loop=True):
+    if isinstance(values, Script) or callable(values):
+        return values
+    return Script(values, loop)
+
+
+def read_script(source):
+    if isinstance(source, Script):
+        return source.next()
+    return source()
+
+
+# Scripted sensor readings, replaced by benchmarks or interactive sessions.
+dht_readings = script([(24.5, 51.0), (25.0, 50.5), (25.5, 50.0), (26.0, 49.0)])
+adc_readings = script([512, 520, 508, 530])
+
+
+class BusStats:
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.transactions = 0
+        self.bytes = 0
+        self.errors = 0
+        self.busy_us = 0
+        self.by_address = {}
+
+    def record(self, address, nbytes, us, error=False):
+        self.transactions += 1
+        self.bytes += nbytes
+        self.busy_us += us
+        entry = self.by_address.get(address)
+        if entry is None:
+            entry = self.by_address[address] = [0, 0, 0]
+        entry[0] += 1
+        entry[1] += nbytes
+        if error:
+            self.errors += 1
+            entry[2] += 1
+
+
+i2c_stats = BusStats()
+socket_stats = BusStats()
+neopixel_stats = BusStats()
+
+# Devices answering on the simulated I2C bus, keyed by 7-bit address.
+i2c_devices = {}
+
+
+def attach_i2c(device):
+    i2c_devices[device.address] = device
+    return device
+
+
+def detach_i2c(address):
+    device = i2c_devices.pop(address, None)
+    if hasattr(device, "detached"):
+        # let the model stop any timers of its own
+        device.detached()
+
+
+def reset_stats():
+    i2c_stats.reset()
+    socket_stats.reset()
+    neopixel_stats.reset()
+
+
+def default_devices():
+    import devices
+    for address in list(i2c_devices):
+        detach_i2c(address)
+    attach_i2c(devices.TSL2561(0x29))
+    attach_i2c(devices.SSD1306(0x3c))
+
+
+_installed = False
+
+
+def install():
+    # Make the MicroPython shims and the firmware modules importable and
+    # patch the CPython time module with the MicroPython extensions.
+    global _installed
+    if _installed:
+        return
+    for path in (ROOT_DIR, SIM_DIR):
+        if path in sys.path:
+            sys.path.remove(path)
+        sys.path.insert(0, path)
+    builtins.const = lambda x: x
+    time.sleep = clock.sleep
+    time.sleep_ms = clock.sleep_ms
+    time.sleep_us = clock.sleep_us
+    time.ticks_ms = clock.ticks_ms
+    time.ticks_us = clock.ticks_us
+    time.ticks_cpu = clock.ticks_cpu
+    time.ticks_add = ticks_add
+    time.ticks_diff = ticks_diff
+    import gc
+    if not hasattr(gc, "mem_free"):
+        gc.mem_free = lambda: 30 * 1024
+        gc.mem_alloc = lambda: 0
+    default_devices()
+    _installed = True
+
+
+def run_script(path, idle_threshold=1, on_idle=None):
+    # Run a firmware script such as main.py. Idle time of the uasyncio
+    # scheduler and every blocking sleep of at least ``idle_threshold``
+    # seconds are reported to ``on_idle`` before the clock advances; raise
+    # StopSimulation from it to end the run.
+    import runpy
+    install()
+
+    def hook(us, idle):
+        if on_idle is not None and (idle or us >= idle_threshold * 1000000):
+            on_idle(us)
+
+    clock.on_sleep = hook
+    try:
+        runpy.run_path(path, run_name="__main__")
+    except StopSimulation:
+        pass
+    finally:
+        clock.on_sleep = None
@@ -0,0 +1,174 @@
+# Local stand-ins for the Node-RED / BC server and an MQTT broker, used by
+# benchmarks. They run on background threads. The HTTP server answers every
+# request with a short JSON body, keeping HTTP/1.1 connections open unless
+# the client asks otherwise.
+
+import json
+import socket
+import socketserver
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        # the reply goes out as headers then body; don't let Nagle hold the
+        # body back until the client's delayed ACK
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _reply(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        self.server.requests.append((self.command, self.path, body))
+        out = json.dumps({"ok": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(out)))
+        self.end_headers()
+        self.wfile.write(out)
+
+    do_GET = _reply
+    do_POST = _reply
+    do_PUT = _reply
+
+    def log_message(self, *args):
+        pass
+
+
+class StandIn:
+
+    def __init__(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+        self.server.daemon_threads = True
+        self.server.requests = []
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def requests(self):
+        return self.server.requests
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _MqttHandler(socketserver.BaseRequestHandler):
+
+    def _read_packet(self, f):
+        b = f.read(1)
+        if not b:
+            return None, None
+        sz = 0
+        sh = 0
+        while True:
+            c = f.read(1)[0]
+            sz |= (c & 0x7f) << sh
+            if not c & 0x80:
+                break
+            sh += 7
+        return b[0], f.read(sz)
+
+    def handle(self):
+        server = self.server
+        sock = self.request
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        f = sock.makefile("rb")
+        subscribed = {}
+        out_pid = 0
+        while True:
+            op, body = self._read_packet(f)
+            if op is None:
+                break
+            server.packets += 1
+            kind = op & 0xf0
+            if kind == 0x10:
+                sock.sendall(b"\x20\x02\x00\x00")
+            elif kind == 0x30:
+                qos = op >> 1 & 3
+                i = 2 + (body[0] << 8 | body[1])
+                topic = body[2:i]
+                pid = b""
+                if qos:
+                    pid = body[i:i + 2]
+                    i += 2
+                msg = body[i:]
+                server.messages.append((topic, msg, qos, bool(op & 8)))
+                if server.ack:
+                    if qos == 1:
+                        sock.sendall(b"\x40\x02" + pid)
+                    elif qos == 2:
+                        sock.sendall(b"\x50\x02" + pid)
+                if topic in subscribed:
+                    # echo back at the QoS granted for the subscription
+                    sub_qos = subscribed[topic]
+                    out = bytes([len(topic) >> 8, len(topic) & 0xff]) + topic
+                    if sub_qos:
+                        out_pid = out_pid % 65535 + 1
+                        out += bytes([out_pid >> 8, out_pid & 0xff])
+                    out += msg
+                    sock.sendall(bytes([0x30 | sub_qos << 1]) + _mqtt_len(len(out)) + out)
+            elif kind == 0x50:
+                # PUBREC for an echoed QoS 2 message
+                sock.sendall(b"\x62\x02" + body[:2])
+            elif kind == 0x60:
+                # PUBREL
+                sock.sendall(b"\x70\x02" + body[:2])
+            elif kind == 0x80:
+                i = 4 + (body[2] << 8 | body[3])
+                subscribed[body[4:i]] = body[i]
+                sock.sendall(b"\x90\x03" + body[:2] + bytes([body[i]]))
+            elif kind == 0xc0:
+                server.pings += 1
+                if server.ack:
+                    sock.sendall(b"\xd0\x00")
+            elif kind == 0xe0:
+                break
+
+
+def _mqtt_len(sz):
+    out = bytearray()
+    while sz > 0x7f:
+        out.append((sz & 0x7f) | 0x80)
+        sz >>= 7
+    out.append(sz)
+    return bytes(out)
+
+
+class MqttStandIn:
+    # Minimal MQTT 3.1.1 broker: acknowledges CONNECT, PUBLISH at QoS 1 and
+    # 2, SUBSCRIBE and PINGREQ, and echoes messages on topics the same
+    # connection subscribed to. Set ack to False to drop the acknowledgements
+    # of PUBLISH and PINGREQ.
+
+    def __init__(self, port=0):
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer(("127.0.0.1", port), _MqttHandler)
+        self.server.daemon_threads = True
+        self.server.messages = []
+        self.server.packets = 0
+        self.server.pings = 0
+        self.server.ack = True
+        self.port = self.server.server_address[1]
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+
+    @property
+    def messages(self):
+        return self.server.messages
+
+    @property
+    def ack(self):
+        return self.server.ack
+
+    @ack.setter
+    def ack(self, value):
+        self.server.ack = value
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
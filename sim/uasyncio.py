@@ -0,0 +1,420 @@
+# Simulated uasyncio (v3 API) running on the virtual clock. When every
+# task is asleep the scheduler advances simulator.clock to the next
+# deadline, so timers and scheduled callbacks fire in between as they
+# would on the board. Stream I/O waits on the host sockets in real time.
+
+import select
+import socket as _socket
+from collections import deque
+from heapq import heappop, heappush
+
+import simulator
+from simulator import clock
+
+
+class CancelledError(BaseException):
+    pass
+
+
+class TimeoutError(Exception):
+    pass
+
+
+class _Yield:
+
+    def __init__(self, kind, arg=None):
+        self.kind = kind
+        self.arg = arg
+
+    def __await__(self):
+        return (yield self)
+
+
+class Task:
+
+    def __init__(self, coro):
+        self.coro = coro
+        self.done_ = False
+        self.result = None
+        self.exc = None
+        self.waiters = []
+        self.token = 0
+        self.cancelled = False
+
+    def done(self):
+        return self.done_
+
+    def cancel(self):
+        if self.done_:
+            return False
+        self.cancelled = True
+        _loop.wake(self, exc=CancelledError())
+        return True
+
+    def __await__(self):
+        while not self.done_:
+            yield _Yield("join", self)
+        if self.exc is not None:
+            raise self.exc
+        return self.result
+
+
+class Loop:
+
+    def __init__(self):
+        self.ready = deque()
+        self.sleeping = []
+        self.io = []
+        self.seq = 0
+        self.current = None
+        self.stopped = False
+
+    def wake(self, task, value=None, exc=None):
+        task.token += 1
+        self.ready.append((task, task.token, value, exc))
+
+    def wake_all(self, waiters):
+        # waiters registered with a stale token have since moved on
+        for task, token in waiters:
+            if task.token == token:
+                self.wake(task)
+
+    def create_task(self, coro):
+        task = coro if isinstance(coro, Task) else Task(coro)
+        self.wake(task)
+        return task
+
+    def _finish(self, task, result=None, exc=None):
+        task.done_ = True
+        task.result = result
+        task.exc = exc
+        waiters = task.waiters
+        task.waiters = []
+        self.wake_all(waiters)
+        if exc is not None and not waiters and not isinstance(exc, CancelledError):
+            print("Task exception wasn't retrieved:", repr(exc))
+
+    def _step(self, task, value, exc):
+        self.current = task
+        try:
+            if exc is not None:
+                request = task.coro.throw(exc)
+            else:
+                request = task.coro.send(value)
+        except StopIteration as e:
+            self._finish(task, e.value)
+            return
+        except CancelledError as e:
+            self._finish(task, exc=e)
+            return
+        except Exception as e:
+            self._finish(task, exc=e)
+            return
+        finally:
+            self.current = None
+        kind = request.kind if isinstance(request, _Yield) else None
+        if kind == "sleep":
+            self.seq += 1
+            heappush(self.sleeping, (clock.now_us + request.arg, self.seq, task, task.token))
+        elif kind == "join":
+            request.arg.waiters.append((task, task.token))
+        elif kind == "event":
+            request.arg.waiting.append((task, task.token))
+        elif kind in ("read", "write"):
+            self.io.append((kind, request.arg, task, task.token))
+        else:
+            self.wake(task)
+
+    def _poll_io(self, timeout):
+        entries = [e for e in self.io if e[2].token == e[3]]
+        self.io = []
+        if not entries:
+            return
+        readers = [e[1] for e in entries if e[0] == "read"]
+        writers = [e[1] for e in entries if e[0] == "write"]
+        r, w, x = select.select(readers, writers, [], timeout)
+        for entry in entries:
+            if entry[1] in (r if entry[0] == "read" else w):
+                self.wake(entry[2])
+            else:
+                self.io.append(entry)
+
+    def _advance(self):
+        while self.sleeping and self.sleeping[0][2].token != self.sleeping[0][3]:
+            heappop(self.sleeping)
+        if self.io:
+            self._poll_io(0 if self.sleeping or self.ready else None)
+            if self.ready:
+                return True
+        if not self.sleeping:
+            return bool(self.io)
+        target = self.sleeping[0][0]
+        for timer in simulator.timers:
+            target = min(target, timer.deadline)
+        if target > clock.now_us:
+            clock.idle_us(target - clock.now_us)
+        while self.sleeping and self.sleeping[0][0] <= clock.now_us:
+            deadline, seq, task, token = heappop(self.sleeping)
+            if task.token == token:
+                self.wake(task)
+        return True
+
+    def run_until(self, main=None):
+        self.stopped = False
+        while not self.stopped and (main is None or not main.done_):
+            if self.ready:
+                task, token, value, exc = self.ready.popleft()
+                if task.token == token and not task.done_:
+                    self._step(task, value, exc)
+            elif not self._advance():
+                break
+
+    def run_forever(self):
+        self.run_until()
+
+    def run_until_complete(self, coro):
+        task = self.create_task(coro)
+        self.run_until(task)
+        if task.exc is not None:
+            raise task.exc
+        return task.result
+
+    def stop(self):
+        self.stopped = True
+
+    def close(self):
+        pass
+
+
+_loop = Loop()
+
+
+def get_event_loop(runq_len=0, waitq_len=0):
+    return _loop
+
+
+def new_event_loop():
+    global _loop
+    _loop = Loop()
+    return _loop
+
+
+def create_task(coro):
+    return _loop.create_task(coro)
+
+
+def current_task():
+    return _loop.current
+
+
+def run(coro):
+    return _loop.run_until_complete(coro)
+
+
+async def sleep_ms(ms):
+    await _Yield("sleep", max(0, int(ms)) * 1000)
+
+
+async def sleep(seconds):
+    await _Yield("sleep", max(0, int(seconds * 1000000)))
+
+
+async def gather(*aws, return_exceptions=False):
+    tasks = [aw if isinstance(aw, Task) else create_task(aw) for aw in aws]
+    results = []
+    for task in tasks:
+        try:
+            results.append(await task)
+        except Exception as e:
+            if not return_exceptions:
+                raise
+            results.append(e)
+    return results
+
+
+async def wait_for_ms(aw, timeout):
+    task = aw if isinstance(aw, Task) else create_task(aw)
+    expired = []
+
+    async def watchdog():
+        await sleep_ms(timeout)
+        if not task.done_:
+            expired.append(True)
+            task.cancel()
+
+    dog = create_task(watchdog())
+    try:
+        return await task
+    except CancelledError:
+        if expired:
+            raise TimeoutError()
+        raise
+    finally:
+        dog.cancel()
+
+
+async def wait_for(aw, timeout):
+    if timeout is None:
+        return await aw
+    return await wait_for_ms(aw, int(timeout * 1000))
+
+
+class Event:
+
+    def __init__(self):
+        self.state = False
+        self.waiting = []
+
+    def is_set(self):
+        return self.state
+
+    def set(self):
+        self.state = True
+        _loop.wake_all(self.waiting)
+        self.waiting = []
+
+    def clear(self):
+        self.state = False
+
+    async def wait(self):
+        while not self.state:
+            await _Yield("event", self)
+        return True
+
+
+class ThreadSafeFlag(Event):
+
+    async def wait(self):
+        await Event.wait(self)
+        self.state = False
+
+
+class Lock:
+
+    def __init__(self):
+        self.state = False
+        self.event = Event()
+
+    def locked(self):
+        return self.state
+
+    async def acquire(self):
+        while self.state:
+            self.event.clear()
+            await self.event.wait()
+        self.state = True
+        return True
+
+    def release(self):
+        if not self.state:
+            raise RuntimeError("Lock not acquired")
+        self.state = False
+        self.event.set()
+
+    async def __aenter__(self):
+        return await self.acquire()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.release()
+
+
+class Stream:
+
+    def __init__(self, sock):
+        self.s = sock
+        self.buf = bytearray()
+        self.out = bytearray()
+
+    def get_extra_info(self, name):
+        if name == "peername":
+            return self.s._sock.getpeername()
+
+    async def _fill(self):
+        while True:
+            try:
+                data = self.s._sock.recv(1024)
+            except BlockingIOError:
+                await _Yield("read", self.s._sock)
+                continue
+            simulator.socket_stats.record("read", len(data), 0)
+            self.buf.extend(data)
+            return len(data)
+
+    async def read(self, n=-1):
+        if n < 0:
+            while await self._fill():
+                pass
+            n = len(self.buf)
+        elif not self.buf:
+            await self._fill()
+        data = bytes(self.buf[:n])
+        del self.buf[:n]
+        return data
+
+    async def readexactly(self, n):
+        while len(self.buf) < n:
+            if not await self._fill():
+                raise EOFError
+        data = bytes(self.buf[:n])
+        del self.buf[:n]
+        return data
+
+    async def readline(self):
+        while True:
+            i = self.buf.find(b"\n")
+            if i >= 0:
+                break
+            if not await self._fill():
+                i = len(self.buf) - 1
+                break
+        data = bytes(self.buf[:i + 1])
+        del self.buf[:i + 1]
+        return data
+
+    def write(self, buf):
+        if isinstance(buf, str):
+            buf = buf.encode()
+        self.out.extend(buf)
+
+    async def drain(self):
+        if self.out:
+            simulator.socket_stats.record("write", len(self.out), 0)
+        while self.out:
+            try:
+                n = self.s._sock.send(self.out)
+            except BlockingIOError:
+                await _Yield("write", self.s._sock)
+                continue
+            del self.out[:n]
+
+    def close(self):
+        self.s.close()
+
+    async def wait_closed(self):
+        pass
+
+    async def aclose(self):
+        self.close()
+
+
+StreamReader = Stream
+StreamWriter = Stream
+
+
+async def open_connection(host, port):
+    import usocket
+    ai = usocket.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)[0]
+    s = usocket.socket(ai[0], ai[1], ai[2])
+    s.setblocking(False)
+    simulator.socket_stats.record("connect", 0, 0)
+    err = s._sock.connect_ex(ai[-1])
+    if err not in (0, 115, 36, 10035):
+        s.close()
+        raise OSError(err)
+    await _Yield("write", s._sock)
+    err = s._sock.getsockopt(_socket.SOL_SOCKET, _socket.SO_ERROR)
+    if err:
+        s.close()
+        raise OSError(err)
+    stream = Stream(s)
+    return stream, stream
@@ -0,0 +1 @@
+from binascii import *
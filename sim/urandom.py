@@ -0,0 +1 @@
+from random import getrandbits, randint, randrange, random, seed, choice, uniform
@@ -0,0 +1 @@
+from re import *
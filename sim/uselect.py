@@ -0,0 +1,54 @@
+# Simulated uselect module. Polling waits on the host sockets; like the
+# uasyncio model, waiting for data that arrives costs no virtual time, while
+# a poll that times out advances the clock by the full timeout. Hosts answer
+# within milliseconds, so a poll with a timeout gives up after at most
+# REAL_WAIT_MS of host time.
+
+import select as _select
+
+import simulator
+
+POLLIN = _select.POLLIN
+POLLOUT = _select.POLLOUT
+POLLERR = _select.POLLERR
+POLLHUP = _select.POLLHUP
+
+REAL_WAIT_MS = 200
+
+
+class _Poll:
+
+    def __init__(self):
+        self._poll = _select.poll()
+        self._objs = {}
+
+    def register(self, obj, eventmask=POLLIN | POLLOUT):
+        self._objs[obj.fileno()] = obj
+        self._poll.register(obj.fileno(), eventmask)
+
+    def modify(self, obj, eventmask):
+        self._poll.modify(obj.fileno(), eventmask)
+
+    def unregister(self, obj):
+        self._poll.unregister(obj.fileno())
+        del self._objs[obj.fileno()]
+
+    def poll(self, timeout=-1):
+        # data already buffered by a simulated socket is ready right away
+        ready = [(obj, POLLIN) for obj in self._objs.values() if getattr(obj, "_buf", None)]
+        if ready:
+            return ready
+        if timeout < 0:
+            events = self._poll.poll()
+        else:
+            events = self._poll.poll(min(timeout, REAL_WAIT_MS))
+            if not events:
+                simulator.clock.sleep_us(timeout * 1000)
+        return [(self._objs[fd], ev) for fd, ev in events]
+
+    def ipoll(self, timeout=-1, flags=0):
+        return iter(self.poll(timeout))
+
+
+def poll():
+    return _Poll()
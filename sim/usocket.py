@@ -0,0 +1,136 @@
+# Simulated usocket module backed by the host network stack. Socket
+# objects expose the MicroPython stream methods (read/readline/write) and
+# record every read and write call in simulator.socket_stats.
+
+import socket as _socket
+
+import simulator
+
+AF_INET = _socket.AF_INET
+AF_INET6 = _socket.AF_INET6
+SOCK_STREAM = _socket.SOCK_STREAM
+SOCK_DGRAM = _socket.SOCK_DGRAM
+SOL_SOCKET = _socket.SOL_SOCKET
+SO_REUSEADDR = _socket.SO_REUSEADDR
+IPPROTO_TCP = _socket.IPPROTO_TCP
+
+error = OSError
+
+# virtual time charged for a DNS lookup and a TCP handshake over WiFi
+DNS_US = 60000
+CONNECT_US = 30000
+
+
+def getaddrinfo(host, port, af=0, type=0, proto=0, flags=0):
+    simulator.clock.advance_us(DNS_US)
+    simulator.socket_stats.record("getaddrinfo", 0, DNS_US)
+    return _socket.getaddrinfo(host, port, af, type, proto, flags)
+
+
+class socket:
+
+    def __init__(self, af=AF_INET, type=SOCK_STREAM, proto=0, sock=None):
+        self._sock = sock if sock is not None else _socket.socket(af, type, proto)
+        self._buf = bytearray()
+        self._blocking = True
+
+    def _fill(self, size=1024):
+        try:
+            data = self._sock.recv(size)
+        except BlockingIOError:
+            return None
+        self._buf.extend(data)
+        return len(data)
+
+    def _take(self, n):
+        data = bytes(self._buf[:n])
+        del self._buf[:n]
+        simulator.socket_stats.record("read", len(data), 0)
+        return data
+
+    def connect(self, address):
+        simulator.clock.advance_us(CONNECT_US)
+        simulator.socket_stats.record("connect", 0, CONNECT_US)
+        self._sock.connect(address)
+
+    def bind(self, address):
+        self._sock.bind(address)
+
+    def listen(self, backlog=1):
+        self._sock.listen(backlog)
+
+    def accept(self):
+        sock, address = self._sock.accept()
+        return socket(sock=sock), address
+
+    def setsockopt(self, level, option, value):
+        self._sock.setsockopt(level, option, value)
+
+    def setblocking(self, flag):
+        self._blocking = bool(flag)
+        self._sock.setblocking(flag)
+
+    def settimeout(self, value):
+        self._blocking = value is None or value > 0
+        self._sock.settimeout(value)
+
+    def fileno(self):
+        return self._sock.fileno()
+
+    def makefile(self, mode="rb", buffering=0):
+        return self
+
+    def write(self, buf, n=None):
+        if isinstance(buf, str):
+            buf = buf.encode()
+        view = memoryview(buf)
+        if n is not None:
+            view = view[:n]
+        simulator.socket_stats.record("write", len(view), 0)
+        self._sock.sendall(view)
+        return len(view)
+
+    send = write
+
+    def sendall(self, buf):
+        self.write(buf)
+
+    def read(self, n=-1):
+        if n is None or n < 0:
+            while self._fill(4096):
+                pass
+            return self._take(len(self._buf))
+        while len(self._buf) < n:
+            got = self._fill(max(n - len(self._buf), 1024) if self._blocking else n - len(self._buf))
+            if got is None:
+                if not self._buf:
+                    return None
+                break
+            if not got:
+                break
+        return self._take(n)
+
+    def recv(self, n):
+        if not self._buf and self._fill(n) is None:
+            raise OSError(11)
+        return self._take(n)
+
+    def readinto(self, buf, nbytes=None):
+        n = len(buf) if nbytes is None else nbytes
+        data = self.read(n)
+        if data is None:
+            return None
+        buf[:len(data)] = data
+        return len(data)
+
+    def readline(self):
+        while True:
+            i = self._buf.find(b"\n")
+            if i >= 0:
+                return self._take(i + 1)
+            got = self._fill()
+            if not got:
+                return self._take(len(self._buf))
+
+    def close(self):
+        self._sock.close()
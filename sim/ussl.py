@@ -0,0 +1,17 @@
+import ssl as _ssl
+
+import usocket
+
+
+def wrap_socket(sock, server_side=False, keyfile=None, certfile=None,
+                cert_reqs=_ssl.CERT_NONE, ca_certs=None, server_hostname=None):
+    context = _ssl.SSLContext(_ssl.PROTOCOL_TLS_SERVER if server_side else _ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = cert_reqs
+    if ca_certs:
+        context.load_verify_locations(ca_certs)
+    if certfile:
+        context.load_cert_chain(certfile, keyfile)
+    raw = context.wrap_socket(sock._sock, server_side=server_side,
+                              server_hostname=server_hostname)
+    return usocket.socket(sock=raw)
@@ -0,0 +1,14 @@
+from simulator import clock, ticks_add, ticks_diff
+import time as _time
+
+sleep = clock.sleep
+sleep_ms = clock.sleep_ms
+sleep_us = clock.sleep_us
+ticks_ms = clock.ticks_ms
+ticks_us = clock.ticks_us
+ticks_cpu = clock.ticks_cpu
+time = clock.time
+
+
+def localtime(secs=None):
+    return _time.gmtime(clock.time() if secs is None else secs)[:8]
@@ -32,9 +32,77 @@ class SSD1306(framebuf.FrameBuffer):
         self.external_vcc = external_vcc
         self.pages = self.height // 8
         self.buffer = bytearray(self.pages * self.width)
+        self.view = memoryview(self.buffer)
+        self.blank = bytes(self.width)
+        # bit n set: page n (rows 8n..8n+7) changed since the last show()
+        self.dirty = (1 << self.pages) - 1
         super().__init__(self.buffer, self.width, self.height, framebuf.MONO_VLSB)
         self.init_display()
 
+    def mark_dirty(self, y=0, h=None):
+        # Flags rows y..y+h-1 (the whole screen by default) for the next
+        # show(). The drawing methods below do this by themselves.
+        if h is None:
+            h = self.height
+        y1 = min(y + h, self.height) - 1
+        if y < 0:
+            y = 0
+        if y1 >= y:
+            self.dirty |= (2 << (y1 >> 3)) - (1 << (y >> 3))
+
+    def fill(self, c):
+        self.dirty = (1 << self.pages) - 1
+        super().fill(c)
+
+    def pixel(self, x, y, c=None):
+        if c is None:
+            return super().pixel(x, y)
+        if 0 <= y < self.height:
+            self.dirty |= 1 << (y >> 3)
+        super().pixel(x, y, c)
+
+    def hline(self, x, y, w, c):
+        self.mark_dirty(y, 1)
+        super().hline(x, y, w, c)
+
+    def vline(self, x, y, h, c):
+        self.mark_dirty(y, h)
+        super().vline(x, y, h, c)
+
+    def line(self, x1, y1, x2, y2, c):
+        self.mark_dirty(min(y1, y2), abs(y2 - y1) + 1)
+        super().line(x1, y1, x2, y2, c)
+
+    def rect(self, x, y, w, h, c):
+        self.mark_dirty(y, h)
+        super().rect(x, y, w, h, c)
+
+    def fill_rect(self, x, y, w, h, c):
+        self.mark_dirty(y, h)
+        super().fill_rect(x, y, w, h, c)
+
+    def text(self, s, x, y, c=1):
+        self.mark_dirty(y, 8)
+        super().text(s, x, y, c)
+
+    def scroll(self, dx, dy):
+        self.mark_dirty()
+        super().scroll(dx, dy)
+
+    def blit(self, fbuf, x, y, *args):
+        self.mark_dirty()
+        super().blit(fbuf, x, y, *args)
+
+    def clear_page(self, page, n=1):
+        # blanks n whole pages (8-row bands) by overwriting their bytes
+        w = self.width
+        for p in range(max(page, 0), min(page + n, self.pages)):
+            self.view[p * w:(p + 1) * w] = self.blank
+            self.dirty |= 1 << p
+
+    def clear_region(self, x, y, w, h):
+        self.fill_rect(x, y, w, h, 0)
+
     def init_display(self):
         for cmd in (
             SET_DISP | 0x00, # off
@@ -75,20 +143,36 @@ class SSD1306(framebuf.FrameBuffer):
     def invert(self, invert):
         self.write_cmd(SET_NORM_INV | (invert & 1))
 
-    def show(self):
+    def show(self, force=False):
+        # Sends only the runs of pages changed since the last show(), or the
+        # whole buffer with force=True
+        if force:
+            self.dirty = (1 << self.pages) - 1
+        if not self.dirty:
+            return
         x0 = 0
         x1 = self.width - 1
         if self.width == 64:
             # displays with width of 64 pixels are shifted by 32
             x0 += 32
             x1 += 32
-        self.write_cmd(SET_COL_ADDR)
-        self.write_cmd(x0)
-        self.write_cmd(x1)
-        self.write_cmd(SET_PAGE_ADDR)
-        self.write_cmd(0)
-        self.write_cmd(self.pages - 1)
-        self.write_data(self.buffer)
+        page = 0
+        while page < self.pages:
+            if not self.dirty >> page & 1:
+                page += 1
+                continue
+            end = page
+            while end + 1 < self.pages and self.dirty >> (end + 1) & 1:
+                end += 1
+            self.write_cmd(SET_COL_ADDR)
+            self.write_cmd(x0)
+            self.write_cmd(x1)
+            self.write_cmd(SET_PAGE_ADDR)
+            self.write_cmd(page)
+            self.write_cmd(end)
+            self.write_data(self.view[page * self.width:(end + 1) * self.width])
+            page = end + 1
+        self.dirty = 0
 
 
 class SSD1306_I2C(SSD1306):
@@ -32,16 +32,64 @@ REG_CMD  = const(0x80)
 REG_DATA = const(0x40)
 
 
-class SSD1327:
-    def __init__(self, width, height, external_vcc):
+# Subclassing FrameBuffer makes the graphics primitives methods of the
+# display itself. Apart from text(), they are the native methods, so drawing
+# costs no more than on a bare FrameBuffer. They don't track what they
+# touch: show() sends the whole frame, unless partial is set and the caller
+# marks everything it draws with mark_dirty().
+class SSD1327(framebuf.FrameBuffer):
+    def __init__(self, width, height, external_vcc, double=False):
         self.width = width
         self.height = height
         self.external_vcc = external_vcc
-        self.buffer = bytearray(self.width * self.height // 2)
-        self.framebuf = framebuf.FrameBuffer(self.buffer, self.width, self.height, framebuf.GS4_HMSB)
+        self.cols = self.width // 2
+        self.buffer = bytearray(self.cols * self.height)
+        self.view = memoryview(self.buffer)
+        # one row of pixels, two per byte
+        self.blank = bytes(self.cols)
+        # with double=True drawing goes to buffer while show_async() sends
+        # from front, a copy of what the panel shows
+        self.front = memoryview(bytearray(len(self.buffer))) if double else None
+        self.flushing = False
+        # a show() came in while show_async() was sending
+        self.queued = False
+        # with partial=True show() sends only the rectangle marked with
+        # mark_dirty() since the last show(): [x0, y0, x1, y1], inclusive
+        self.partial = False
+        self.dirty = None
+        super().__init__(self.buffer, self.width, self.height, framebuf.GS4_HMSB)
+        self.framebuf = self
         self.poweron()
         self.init_display()
 
+    def mark_dirty(self, x=0, y=0, w=None, h=None):
+        # Adds a rectangle (the whole screen by default) to the area sent by
+        # the next show() when partial is set. Without any marks show() sends
+        # the whole frame; once something is marked, only the marked area
+        # goes out, so mark everything drawn since the last show().
+        if w is None:
+            w = self.width
+        if h is None:
+            h = self.height
+        x1 = min(x + w, self.width) - 1
+        y1 = min(y + h, self.height) - 1
+        x = max(x, 0)
+        y = max(y, 0)
+        if x1 < x or y1 < y:
+            return
+        d = self.dirty
+        if d is None:
+            self.dirty = [x, y, x1, y1]
+            return
+        if x < d[0]:
+            d[0] = x
+        if y < d[1]:
+            d[1] = y
+        if x1 > d[2]:
+            d[2] = x1
+        if y1 > d[3]:
+            d[3] = y1
+
     def init_display(self):
         for cmd in (
             SET_COMMAND_LOCK, 0x12, # Unlock
@@ -101,35 +149,117 @@ class SSD1327:
     def invert(self, invert):
         self.write_cmd(SET_DISP_MODE | (invert & 1) << 1 | (invert & 1)) # 0xA4=Normal, 0xA7=Inverted
 
-    def show(self):
+    def _window(self, force):
+        # takes the dirty rectangle as a byte-column and row window
+        d = self.dirty
+        self.dirty = None
+        if force or d is None or not self.partial:
+            return 0, 0, self.cols - 1, self.height - 1
+        return d[0] // 2, d[1], d[2] // 2, d[3]
+
+    def _set_window(self, c0, r0, c1, r1):
+        offset = (128 - self.width) // 4
         self.write_cmd(SET_COL_ADDR)
-        self.write_cmd((128 - self.width) // 4)
-        self.write_cmd(63 - ((128 - self.width) // 4))
+        self.write_cmd(offset + c0)
+        self.write_cmd(offset + c1)
         self.write_cmd(SET_ROW_ADDR)
-        self.write_cmd(0x00)
-        self.write_cmd(self.height - 1)
-        self.write_data(self.buffer)
+        self.write_cmd(r0)
+        self.write_cmd(r1)
+
+    def _send(self, src, c0, r0, c1, r1):
+        if c0 == 0 and c1 == self.cols - 1:
+            # full-width rows are contiguous
+            self.write_data(src[r0 * self.cols:(r1 + 1) * self.cols])
+        else:
+            self.write_rows(src, self.cols, c0, c1 + 1, r0, r1 + 1)
+
+    def _copy(self, c0, r0, c1, r1):
+        # copies the window from the drawing buffer to the front buffer
+        for row in range(r0, r1 + 1):
+            a = row * self.cols
+            self.front[a + c0:a + c1 + 1] = self.view[a + c0:a + c1 + 1]
 
-    def fill(self, col):
-        self.framebuf.fill(col)
+    def show(self, force=False):
+        # Sends the whole buffer, or with partial set the window marked with
+        # mark_dirty() since the last show() (the whole buffer if nothing was
+        # marked or with force=True)
+        if self.flushing:
+            # show_async() is sending and the controller's window must stay
+            # put; this window goes out as soon as it is done
+            if force:
+                self.mark_dirty()
+            self.queued = True
+            return
+        win = self._window(force)
+        src = self.view
+        if self.front is not None:
+            self._copy(*win)
+            src = self.front
+        self._set_window(*win)
+        self._send(src, *win)
 
-    def pixel(self, x, y, col):
-        self.framebuf.pixel(x, y, col)
+    async def show_async(self, force=False, rows=8):
+        # Like show(), but sends rows rows at a time and lets other tasks run
+        # in between. With double=True drawing can go on meanwhile.
+        import uasyncio
+        while self.flushing:
+            await uasyncio.sleep_ms(1)
+        c0, r0, c1, r1 = self._window(force)
+        src = self.view
+        if self.front is not None:
+            self._copy(c0, r0, c1, r1)
+            src = self.front
+        self.flushing = True
+        # the window must not be moved by anyone else while it is being sent
+        lock = self._bus_lock()
+        if lock is not None:
+            await lock.acquire()
+        try:
+            self._set_window(c0, r0, c1, r1)
+            # the controller's address pointer carries on between transfers
+            for r in range(r0, r1 + 1, rows):
+                self._send(src, c0, r, c1, min(r + rows - 1, r1))
+                await uasyncio.sleep_ms(0)
+        finally:
+            if lock is not None:
+                lock.release()
+            self.flushing = False
+        if self.queued:
+            self.queued = False
+            self.show()
 
-    def scroll(self, dx, dy):
-        self.framebuf.scroll(dx, dy)
-        # software scroll
+    def _bus_lock(self):
+        return None
 
     def text(self, string, x, y, col=15):
-        self.framebuf.text(string, x, y, col)
+        # white by default, FrameBuffer.text() would draw in grey level 1
+        super().text(string, x, y, col)
+
+    def clear_rows(self, y, h):
+        # rows are contiguous in the buffer, so blank them a row at a time
+        self.mark_dirty(0, y, self.width, h)
+        for row in range(max(y, 0), min(y + h, self.height)):
+            self.view[row * self.cols:(row + 1) * self.cols] = self.blank
+
+    def clear_line(self, line):
+        # 8-row text line, numbered from 1
+        self.clear_rows(8 * (line - 1), 8)
+
+    def clear_region(self, x, y, w, h):
+        self.mark_dirty(x, y, w, h)
+        self.fill_rect(x, y, w, h, 0)
 
 
 class SSD1327_I2C(SSD1327):
-    def __init__(self, width, height, i2c, addr=0x3c, external_vcc=False):
+    def __init__(self, width, height, i2c, addr=0x3c, external_vcc=False, double=False):
         self.i2c = i2c
         self.addr = addr
         self.temp = bytearray(2)
-        super().__init__(width, height, external_vcc)
+        super().__init__(width, height, external_vcc, double)
+
+    def _bus_lock(self):
+        # the shared bus of wio_link has a lock, a bare machine.I2C has not
+        return self.i2c.lock() if hasattr(self.i2c, "lock") else None
 
     def write_cmd(self, cmd):
         self.temp[0] = REG_CMD # Co=1, D/C#=0
@@ -144,10 +274,20 @@ class SSD1327_I2C(SSD1327):
         self.i2c.write(buf)
         self.i2c.stop()
 
+    def write_rows(self, buf, cols, c0, c1, r0, r1):
+        # bytes c0..c1-1 of rows r0..r1-1 as one data transfer
+        self.temp[0] = self.addr << 1
+        self.temp[1] = REG_DATA # Co=0, D/C#=1
+        self.i2c.start()
+        self.i2c.write(self.temp)
+        for row in range(r0, r1):
+            self.i2c.write(buf[row * cols + c0:row * cols + c1])
+        self.i2c.stop()
+
 
 class SEEED_OLED_96X96(SSD1327_I2C):
-    def __init__(self, i2c):
-        super().__init__(96, 96, i2c)
+    def __init__(self, i2c, double=False):
+        super().__init__(96, 96, i2c, double=double)
 
     def rotate(self, rotate):
         self.poweroff()
@@ -4,6 +4,7 @@ import ustruct
 
 _COMMAND_BIT = const(0x80)
 _WORD_BIT = const(0x20)
+_BLOCK_BIT = const(0x10)
 
 _REGISTER_CONTROL = const(0x00)
 _REGISTER_TIMING = const(0x01)
@@ -28,6 +29,33 @@ _INTEGRATION_TIME = {
     0:      (0x03,  0,      0,      0,      0,      0),
 }
 
+# Fixed-point scales of the datasheet's integer lux calculation
+_LUX_SCALE = const(14)
+_RATIO_SCALE = const(9)
+_CH_SCALE = const(10)
+# Fraction bits kept in the scaled channels, so dim light keeps its sub-lux
+# resolution; products still fit a small int at every setting
+_CH_FRAC = const(3)
+
+# _LUX_SCALE table -> (segment of every ratio up to the last K, Bs, Ms)
+_SEGMENTS = {}
+
+
+def _segments(table):
+    # A byte per ratio giving its row of the table, so finding the row is an
+    # index instead of a walk
+    seg = _SEGMENTS.get(id(table))
+    if seg is None:
+        index = bytearray(table[-1][0] + 1)
+        row = 0
+        for ratio in range(len(index)):
+            while ratio > table[row][0]:
+                row += 1
+            index[ratio] = row
+        seg = _SEGMENTS[id(table)] = (bytes(index),
+            tuple(r[1] for r in table), tuple(r[2] for r in table))
+    return seg
+
 
 class TSL2561:
     _LUX_SCALE = (
@@ -48,6 +76,13 @@ class TSL2561:
         if not sensor_id & 0x10:
             raise RuntimeError("bad sensor id 0x{:x}".format(sensor_id))
         self._active = False
+        self._continuous = False
+        # powered up by start() and to be powered down by result()
+        self._oneshot = False
+        # when the current integration cycle began
+        self._started = time.ticks_ms()
+        self._channels = bytearray(4)
+        self._seg, self._b, self._m = _segments(self._LUX_SCALE)
         self._gain = 1
         self._integration_time = 13
         self._update_gain_and_time()
@@ -75,6 +110,17 @@ class TSL2561:
             self._active = value
             self._register8(_REGISTER_CONTROL,
                 _CONTROL_POWERON if value else _CONTROL_POWEROFF)
+            if value:
+                self._started = time.ticks_ms()
+
+    def continuous(self, value=None):
+        # In continuous mode the ADC keeps converting, so reads return the
+        # latest conversion without powering up and waiting each time
+        if value is None:
+            return self._continuous
+        self._continuous = bool(value)
+        self._oneshot = False
+        self.active(self._continuous)
 
     def gain(self, value=None):
         if value is None:
@@ -98,59 +144,167 @@ class TSL2561:
         self._register8(_REGISTER_TIMING,
             _INTEGRATION_TIME[self._integration_time][0] |
             {1: 0x00, 16: 0x10}[self._gain]);
+        # new settings restart the integration cycle
+        self._started = time.ticks_ms()
         self.active(was_active)
+        # channel scale for these settings, normalized to 1x gain
+        self._clip = _INTEGRATION_TIME[self._integration_time][2]
+        self._ch_scale = _INTEGRATION_TIME[self._integration_time][5]
+        self._ch_shift = _CH_SCALE - _CH_FRAC + (4 if self._gain == 16 else 0)
 
     def sensor_id(self):
         return self._register8(_REGISTER_ID)
 
+    def start(self):
+        # Starts a conversion, powering the sensor up unless it is on, and
+        # returns the ms until ready()
+        if not self._active:
+            self.active(True)
+            self._oneshot = True
+        return self._remaining()
+
+    def _remaining(self):
+        wait = _INTEGRATION_TIME[self._integration_time][1]
+        return max(0, wait - time.ticks_diff(time.ticks_ms(), self._started))
+
+    def ready(self):
+        # True once a conversion with the current settings has completed
+        return self._remaining() == 0
+
+    def _read_channels(self):
+        # both channels in one block read
+        self.i2c.readfrom_mem_into(self.address,
+            _COMMAND_BIT | _BLOCK_BIT | _REGISTER_CHANNEL0, self._channels)
+        if self._oneshot:
+            self._oneshot = False
+            self.active(False)
+        return ustruct.unpack('<HH', self._channels)
+
+    def result(self, autogain=False, raw=False):
+        # Reads the conversion started by start() once ready(). Returns None
+        # if autogain changed the gain and the reading has to be repeated.
+        return self._value(self._read_channels(), autogain, raw)
+
     def _read(self):
-        was_active = self.active()
-        self.active(True)
-        if not was_active:
-            # if the sensor was off, wait for measurement
-            time.sleep_ms(_INTEGRATION_TIME[self._integration_time][1])
-        broadband = self._register16(_REGISTER_CHANNEL0)
-        ir = self._register16(_REGISTER_CHANNEL1)
-        self.active(was_active)
-        return broadband, ir
+        time.sleep_ms(self.start())
+        return self._read_channels()
+
+    async def _read_async(self):
+        # Starting the conversion and reading it are separate transactions;
+        # each holds the bus lock, the integration time in between does not
+        import uasyncio
+        lock = self._bus_lock()
+        if lock is not None:
+            await lock.acquire()
+        try:
+            wait = self.start()
+        finally:
+            if lock is not None:
+                lock.release()
+        await uasyncio.sleep_ms(wait)
+        if lock is not None:
+            await lock.acquire()
+        try:
+            return self._read_channels()
+        finally:
+            if lock is not None:
+                lock.release()
+
+    def _bus_lock(self):
+        # the shared bus of wio_link has a lock, a bare machine.I2C has not
+        return self.i2c.lock() if hasattr(self.i2c, "lock") else None
+
+    def _saturated(self, channels):
+        clip = _INTEGRATION_TIME[self._integration_time][2]
+        return channels[0] > clip or channels[1] > clip
 
     def _lux(self, channels):
         if self._integration_time == 0:
             raise ValueError(
                 "can't calculate lux with manual integration time")
         broadband, ir = channels
-        clip = _INTEGRATION_TIME[self._integration_time][2]
-        if broadband > clip or ir > clip:
+        if broadband > self._clip or ir > self._clip:
             raise ValueError("sensor saturated")
-        scale = _INTEGRATION_TIME[self._integration_time][5] / self._gain
-        channel0 = (broadband * scale) / 1024
-        channel1 = (ir * scale) / 1024
-        ratio = (((channel1 * 1024) / channel0 if channel0 else 0) + 1) / 2
-        for k, b, m in self._LUX_SCALE:
-            if ratio <= k:
-                break
+        return (self._lux_fixed(broadband, ir) + (1 << (_LUX_SCALE + _CH_FRAC - 1))) \
+            / (1 << (_LUX_SCALE + _CH_FRAC))
+
+    def _lux_fixed(self, broadband, ir):
+        # The datasheet's integer calculation, with _LUX_SCALE + _CH_FRAC
+        # fraction bits; every product stays a small int for unsaturated
+        # counts, so nothing is allocated
+        channel0 = (broadband * self._ch_scale) >> self._ch_shift
+        channel1 = (ir * self._ch_scale) >> self._ch_shift
+        ratio = 0
+        if channel0:
+            ratio = (channel1 << (_RATIO_SCALE + 1)) // channel0
+        ratio = (ratio + 1) >> 1
+        if ratio < len(self._seg):
+            row = self._seg[ratio]
+            lux = channel0 * self._b[row] - channel1 * self._m[row]
         else:
-            b = 0
-            m = 0
-        return (max(0, channel0 * b - channel1 * m) + 8192) / 16384
+            lux = 0
+        if lux < 0:
+            lux = 0
+        return lux
+
+    def lux_into(self, raw, out, saturated=0xffff):
+        # Converts interleaved (broadband, ir) counts in raw, as read with the
+        # current gain and integration time, into out, one lux per pair
+        # rounded to a whole lux. Saturated pairs become saturated. Returns
+        # the number of pairs.
+        if self._integration_time == 0:
+            raise ValueError(
+                "can't calculate lux with manual integration time")
+        n = min(len(raw) // 2, len(out))
+        clip = self._clip
+        shift = _LUX_SCALE + _CH_FRAC
+        half = 1 << (shift - 1)
+        for i in range(n):
+            broadband = raw[2 * i]
+            ir = raw[2 * i + 1]
+            if broadband > clip or ir > clip:
+                out[i] = saturated
+            else:
+                out[i] = (self._lux_fixed(broadband, ir) + half) >> shift
+        return n
+
+    def _autogain(self, broadband):
+        if self._integration_time == 0:
+            raise ValueError(
+                "can't do autogain with manual integration time")
+        new_gain = self._gain
+        if broadband < _INTEGRATION_TIME[self._integration_time][3]:
+            new_gain = 16
+        elif broadband > _INTEGRATION_TIME[self._integration_time][4]:
+            new_gain = 1
+        if new_gain != self._gain:
+            self.gain(new_gain)
+            return True
+        return False
+
+    def _value(self, channels, autogain, raw):
+        # The lux (or raw counts) of a reading at the gain it was taken with.
+        # Autogain only sets the gain for the conversions after it; the
+        # reading is repeated (None) only if it is unusable as it is.
+        saturated = not raw and self._saturated(channels)
+        value = channels if raw or saturated else self._lux(channels)
+        if autogain and self._autogain(channels[0]) and (raw or saturated):
+            return None
+        if saturated:
+            raise ValueError("sensor saturated")
+        return value
 
     def read(self, autogain=False, raw=False):
-        broadband, ir = self._read()
-        if autogain:
-            if self._integration_time == 0:
-                raise ValueError(
-                    "can't do autogain with manual integration time")
-            new_gain = self._gain
-            if broadband < _INTEGRATION_TIME[self._integration_time][3]:
-                new_gain = 16
-            elif broadband > _INTEGRATION_TIME[self._integration_time][4]:
-                new_gain = 1
-            if new_gain != self._gain:
-                self.gain(new_gain)
-                broadband, ir = self._read()
-        if raw:
-            return broadband, ir
-        return self._lux((broadband, ir))
+        value = self._value(self._read(), autogain, raw)
+        if value is None:
+            value = self._value(self._read(), False, raw)
+        return value
+
+    async def read_async(self, autogain=False, raw=False):
+        value = self._value(await self._read_async(), autogain, raw)
+        if value is None:
+            value = self._value(await self._read_async(), False, raw)
+        return value
 
     def threshold(self, cycles=None, min_value=None, max_value=None):
         if min_value is None and max_value is None and cycles is None:
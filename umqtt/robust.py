@@ -1,13 +1,46 @@
 import utime
+import uerrno
+import uos
+import urandom
+import ustruct as struct
 from . import simple
 
 class MQTTClient(simple.MQTTClient):
 
     DELAY = 2
+    MAX_DELAY = 60
     DEBUG = False
+    # Messages published while offline wait in RAM, QUEUE_SIZE of them,
+    # then in the SPOOL file on flash, up to SPOOL_SIZE bytes. After a
+    # reconnect they are sent at DRAIN_RATE messages per second.
+    QUEUE_SIZE = 16
+    SPOOL = "mqtt.spool"
+    SPOOL_SIZE = 16384
+    DRAIN_RATE = 5
+
+    def __init__(self, *args, **kw):
+        super().__init__(*args, **kw)
+        self.online = False
+        self.attempts = 0
+        self.retry_at = utime.ticks_ms()
+        self.drained = self.retry_at
+        self.queue = []
+        self.dropped = 0
+        self.spool_pos = 0
+        try:
+            # left over from before a reset
+            self.spool_size = uos.stat(self.SPOOL)[6]
+        except OSError:
+            self.spool_size = 0
+
+    def backoff(self, i):
+        # ms to wait after the i-th failed attempt: doubles from DELAY up to
+        # MAX_DELAY, randomized so that devices don't reconnect in lockstep
+        d = min(self.DELAY << min(i, 16), self.MAX_DELAY) * 1000
+        return d // 2 + urandom.getrandbits(16) % (d // 2 + 1)
 
     def delay(self, i):
-        utime.sleep(self.DELAY)
+        utime.sleep_ms(self.backoff(i))
 
     def log(self, in_reconnect, e):
         if self.DEBUG:
@@ -16,23 +49,174 @@ class MQTTClient(simple.MQTTClient):
             else:
                 print("mqtt: %r" % e)
 
+    def connect(self, clean_session=True):
+        try:
+            r = super().connect(clean_session)
+        except (IndexError, AssertionError):
+            # a CONNACK cut short or garbled, e.g. the broker closed the
+            # connection during the handshake
+            self._close()
+            raise OSError(uerrno.ECONNABORTED)
+        except Exception:
+            # don't leak the socket of a failed attempt
+            self._close()
+            raise
+        self.online = True
+        self.attempts = 0
+        self.drained = utime.ticks_ms()
+        return r
+
+    def _close(self):
+        if self.sock is not None:
+            try:
+                self.sock.close()
+            except OSError:
+                pass
+            self.sock = None
+
+    def _offline(self):
+        self.online = False
+        self.retry_at = utime.ticks_ms()
+        self._close()
+
     def reconnect(self):
         i = 0
         while 1:
             try:
-                return super().connect(False)
+                return self.connect(False)
             except OSError as e:
                 self.log(True, e)
-                i += 1
                 self.delay(i)
+                i += 1
+
+    def _service(self):
+        # Reconnects if the backoff allows it, then drains the queue.
+        # Returns whether the client is online.
+        if not self.online:
+            if utime.ticks_diff(utime.ticks_ms(), self.retry_at) < 0:
+                return False
+            try:
+                self.connect(False)
+            except (OSError, simple.MQTTException) as e:
+                self.log(True, e)
+                self.retry_at = utime.ticks_add(utime.ticks_ms(), self.backoff(self.attempts))
+                self.attempts += 1
+                return False
+        self._drain()
+        return self.online
+
+    def pending(self):
+        return bool(self.queue) or self.spool_pos < self.spool_size
+
+    def _room(self, qos):
+        return qos == 0 or len(self.inflight) < self.window
 
     def publish(self, topic, msg, retain=False, qos=0):
-        while 1:
+        # Never blocks on the broker: while offline, or while older messages
+        # are still queued, the message is queued and None returned.
+        if self._service() and not self.pending() and self._room(qos):
             try:
                 return super().publish(topic, msg, retain, qos)
             except OSError as e:
                 self.log(False, e)
-            self.reconnect()
+                self._offline()
+        self._enqueue(topic, msg, retain, qos)
+
+    def publish_many(self, msgs, retain=False, qos=0):
+        if self._service() and not self.pending() \
+                and (qos == 0 or len(msgs) <= self.window - len(self.inflight)):
+            try:
+                return super().publish_many(msgs, retain, qos)
+            except OSError as e:
+                self.log(False, e)
+                self._offline()
+        for topic, msg in msgs:
+            self._enqueue(topic, msg, retain, qos)
+
+    def _enqueue(self, topic, msg, retain, qos):
+        if len(self.queue) < self.QUEUE_SIZE and self.spool_pos == self.spool_size:
+            self.queue.append((topic, msg, retain, qos))
+            return
+        # once spilling, everything goes to the file to keep the order
+        if isinstance(topic, str):
+            topic = topic.encode()
+        if isinstance(msg, str):
+            msg = msg.encode()
+        size = 5 + len(topic) + len(msg)
+        if self.spool_size + size > self.SPOOL_SIZE:
+            self.dropped += 1
+            return
+        with open(self.SPOOL, "ab") as f:
+            f.write(struct.pack("!BHH", qos << 1 | retain, len(topic), len(msg)))
+            f.write(topic)
+            f.write(msg)
+        self.spool_size += size
+
+    def _next(self):
+        if self.queue:
+            return self.queue[0]
+        with open(self.SPOOL, "rb") as f:
+            f.seek(self.spool_pos)
+            head = f.read(5)
+            if len(head) == 5:
+                flags, topic_len, msg_len = struct.unpack("!BHH", head)
+                topic = f.read(topic_len)
+                msg = f.read(msg_len)
+                if len(msg) == msg_len:
+                    return topic, msg, flags & 1, flags >> 1
+        # a record cut short by a reset
+        self._clear_spool()
+        return None
+
+    def _pop(self, m):
+        if self.queue:
+            self.queue.pop(0)
+            return
+        self.spool_pos += 5 + len(m[0]) + len(m[1])
+        if self.spool_pos >= self.spool_size:
+            self._clear_spool()
+
+    def _clear_spool(self):
+        try:
+            uos.remove(self.SPOOL)
+        except OSError:
+            pass
+        self.spool_pos = 0
+        self.spool_size = 0
+
+    def _drain(self):
+        now = utime.ticks_ms()
+        budget = utime.ticks_diff(now, self.drained) * self.DRAIN_RATE // 1000
+        if budget <= 0:
+            return
+        self.drained = now
+        budget = min(budget, self.DRAIN_RATE)
+        while budget and self.pending():
+            m = self._next()
+            if m is None:
+                break
+            if not self._room(m[3]):
+                break
+            try:
+                super().publish(m[0], m[1], m[2], m[3])
+            except OSError as e:
+                self.log(False, e)
+                self._offline()
+                return
+            self._pop(m)
+            budget -= 1
+
+    def check_msg(self):
+        if not self._service():
+            return None
+        try:
+            self._keepalive()
+            op = self._read_pending()
+            self._retransmit()
+            return op
+        except OSError as e:
+            self.log(False, e)
+            self._offline()
 
     def wait_msg(self):
         while 1:
@@ -1,14 +1,22 @@
 import usocket as socket
+import utime
+import uselect
+import uerrno
 import ustruct as struct
 from ubinascii import hexlify
+import dnscache
 
 class MQTTException(Exception):
     pass
 
+# Initial size of the buffer packets are assembled in. Payloads that don't
+# fit in it are written separately instead of growing it.
+BUF_SIZE = 256
+
 class MQTTClient:
 
     def __init__(self, client_id, server, port=0, user=None, password=None, keepalive=0,
-                 ssl=False, ssl_params={}):
+                 ssl=False, ssl_params={}, window=4, retry_ms=5000):
         if port == 0:
             port = 8883 if ssl else 1883
         self.client_id = client_id
@@ -26,10 +34,72 @@ class MQTTClient:
         self.lw_msg = None
         self.lw_qos = 0
         self.lw_retain = False
+        self.buf = bytearray(BUF_SIZE)
+        # QoS 1/2 publishes awaiting acknowledgement, at most window of them:
+        # pid -> [qos, stage, sent, topic, msg, retain], where stage 1 means
+        # PUBREC arrived and PUBREL was sent. Unacknowledged packets are sent
+        # again after retry_ms.
+        self.window = window
+        self.retry_ms = retry_ms
+        self.inflight = {}
+        # ids of incoming QoS 2 messages delivered but not yet released
+        self.rcv_pids = set()
+        self.poller = None
+        # link health: when a packet was last sent and received, when the
+        # outstanding PINGREQ (if any) went out, and the last ping round trip
+        self.last_tx = 0
+        self.last_rx = 0
+        self.ping_at = None
+        self.rtt = None
+        self.pings = 0
+
+    def _write(self, buf, n=None):
+        self.last_tx = utime.ticks_ms()
+        if n is None:
+            self.sock.write(buf)
+        else:
+            self.sock.write(buf, n)
+
+    def _reserve(self, size):
+        if size > len(self.buf):
+            self.buf.extend(bytearray(size - len(self.buf)))
+
+    def _put_header(self, n, op, sz):
+        # fixed header: packet type and flags, then the remaining length
+        self._reserve(n + 5)
+        self.buf[n] = op
+        n += 1
+        while sz > 0x7f:
+            self.buf[n] = (sz & 0x7f) | 0x80
+            sz >>= 7
+            n += 1
+        self.buf[n] = sz
+        return n + 1
+
+    def _put(self, n, s):
+        if isinstance(s, str):
+            s = s.encode()
+        self._reserve(n + len(s))
+        self.buf[n:n + len(s)] = s
+        return n + len(s)
+
+    def _put_str(self, n, s):
+        if isinstance(s, str):
+            s = s.encode()
+        self._reserve(n + 2)
+        struct.pack_into("!H", self.buf, n, len(s))
+        return self._put(n + 2, s)
+
+    def _put_pid(self, n, pid):
+        self._reserve(n + 2)
+        struct.pack_into("!H", self.buf, n, pid)
+        return n + 2
 
-    def _send_str(self, s):
-        self.sock.write(struct.pack("!H", len(s)))
-        self.sock.write(s)
+    def _next_pid(self):
+        self.pid = self.pid % 65535 + 1
+        while self.pid in self.inflight:
+            self.pid = self.pid % 65535 + 1
+        return self.pid
 
     def _recv_len(self):
         n = 0
@@ -54,108 +124,208 @@ class MQTTClient:
 
     def connect(self, clean_session=True):
         self.sock = socket.socket()
-        addr = socket.getaddrinfo(self.server, self.port)[0][-1]
-        self.sock.connect(addr)
+        addr = dnscache.getaddrinfo(self.server, self.port)[0][-1]
+        addr = (addr[0], self.port)
+        try:
+            self.sock.connect(addr)
+        except OSError:
+            dnscache.forget(self.server)
+            raise
         if self.ssl:
             import ussl
             self.sock = ussl.wrap_socket(self.sock, **self.ssl_params)
-        premsg = bytearray(b"\x10\0\0\0\0\0")
-        msg = bytearray(b"\x04MQTT\x04\x02\0\0")
+        self.poller = uselect.poll()
+        self.poller.register(self.sock, uselect.POLLIN)
+        msg = bytearray(b"\0\x04MQTT\x04\x02\0\0")
 
         sz = 10 + 2 + len(self.client_id)
-        msg[6] = clean_session << 1
+        msg[7] = clean_session << 1
         if self.user is not None:
             sz += 2 + len(self.user) + 2 + len(self.pswd)
-            msg[6] |= 0xC0
+            msg[7] |= 0xC0
         if self.keepalive:
             assert self.keepalive < 65536
-            msg[7] |= self.keepalive >> 8
-            msg[8] |= self.keepalive & 0x00FF
+            msg[8] |= self.keepalive >> 8
+            msg[9] |= self.keepalive & 0x00FF
         if self.lw_topic:
             sz += 2 + len(self.lw_topic) + 2 + len(self.lw_msg)
-            msg[6] |= 0x4 | (self.lw_qos & 0x1) << 3 | (self.lw_qos & 0x2) << 3
-            msg[6] |= self.lw_retain << 5
+            msg[7] |= 0x4 | (self.lw_qos & 0x1) << 3 | (self.lw_qos & 0x2) << 3
+            msg[7] |= self.lw_retain << 5
 
-        i = 1
-        while sz > 0x7f:
-            premsg[i] = (sz & 0x7f) | 0x80
-            sz >>= 7
-            i += 1
-        premsg[i] = sz
-
-        self.sock.write(premsg, i + 2)
-        self.sock.write(msg)
+        n = self._put_header(0, 0x10, sz)
+        n = self._put(n, msg)
         #print(hex(len(msg)), hexlify(msg, ":"))
-        self._send_str(self.client_id)
+        n = self._put_str(n, self.client_id)
         if self.lw_topic:
-            self._send_str(self.lw_topic)
-            self._send_str(self.lw_msg)
+            n = self._put_str(n, self.lw_topic)
+            n = self._put_str(n, self.lw_msg)
         if self.user is not None:
-            self._send_str(self.user)
-            self._send_str(self.pswd)
+            n = self._put_str(n, self.user)
+            n = self._put_str(n, self.pswd)
+        self._write(self.buf, n)
         resp = self.sock.read(4)
         assert resp[0] == 0x20 and resp[1] == 0x02
         if resp[3] != 0:
             raise MQTTException(resp[3])
+        self.last_rx = utime.ticks_ms()
+        self.ping_at = None
+        if clean_session:
+            self.inflight.clear()
+            self.rcv_pids.clear()
+        else:
+            # the session survives; resend whatever was not acknowledged
+            self._retransmit(True)
         return resp[2] & 1
 
     def disconnect(self):
-        self.sock.write(b"\xe0\0")
+        self._write(b"\xe0\0")
         self.sock.close()
 
     def ping(self):
-        self.sock.write(b"\xc0\0")
+        self._write(b"\xc0\0")
+        self.pings += 1
+        if self.ping_at is None:
+            self.ping_at = self.last_tx
 
-    def publish(self, topic, msg, retain=False, qos=0):
-        pkt = bytearray(b"\x30\0\0\0")
-        pkt[0] |= qos << 1 | retain
+    def _read_pending(self):
+        # Processes whatever the broker already sent, without blocking, so
+        # a PINGRESP is seen by clients that only ever publish and no
+        # acknowledged publish is retransmitted. Returns the result of the
+        # last packet, as wait_msg() would.
+        op = None
+        while self.poller.poll(0):
+            op = MQTTClient.wait_msg(self)
+        return op
+
+    def _keepalive(self, ping=True):
+        # Pings once nothing has been sent for half the keepalive period, and
+        # gives up on the connection if the PINGRESP takes as long again.
+        # Callers about to send a packet pass ping=False, since that packet
+        # resets the broker's keepalive timer as well.
+        if not self.keepalive:
+            return
+        if self.ping_at is not None:
+            self._read_pending()
+        half = self.keepalive * 500
+        now = utime.ticks_ms()
+        if self.ping_at is not None:
+            if utime.ticks_diff(now, self.ping_at) > half:
+                raise OSError(uerrno.ETIMEDOUT)
+        elif ping and utime.ticks_diff(now, self.last_tx) >= half:
+            self.ping()
+
+    def stats(self):
+        # rtt of the last ping and ms since the broker was last heard from
+        now = utime.ticks_ms()
+        return {"rtt": self.rtt, "last_seen": utime.ticks_diff(now, self.last_rx),
+                "idle": utime.ticks_diff(now, self.last_tx), "pings": self.pings,
+                "inflight": len(self.inflight)}
+
+    def _put_publish(self, n, topic, msg, retain, qos, pid, dup=False):
+        # Packs a PUBLISH packet up to its payload at offset n
         sz = 2 + len(topic) + len(msg)
         if qos > 0:
             sz += 2
         assert sz < 2097152
-        i = 1
-        while sz > 0x7f:
-            pkt[i] = (sz & 0x7f) | 0x80
-            sz >>= 7
-            i += 1
-        pkt[i] = sz
-        #print(hex(len(pkt)), hexlify(pkt, ":"))
-        self.sock.write(pkt, i + 1)
-        self._send_str(topic)
+        n = self._put_header(n, 0x30 | dup << 3 | qos << 1 | retain, sz)
+        n = self._put_str(n, topic)
         if qos > 0:
-            self.pid += 1
-            pid = self.pid
-            struct.pack_into("!H", pkt, 0, pid)
-            self.sock.write(pkt, 2)
-        self.sock.write(msg)
-        if qos == 1:
-            while 1:
-                op = self.wait_msg()
-                if op == 0x40:
-                    sz = self.sock.read(1)
-                    assert sz == b"\x02"
-                    rcv_pid = self.sock.read(2)
-                    rcv_pid = rcv_pid[0] << 8 | rcv_pid[1]
-                    if pid == rcv_pid:
-                        return
-        elif qos == 2:
-            assert 0
+            n = self._put_pid(n, pid)
+        return n
+
+    def _send(self, n, msg):
+        # Writes the packet buffer and then msg, in one write if msg fits
+        if len(msg) <= len(self.buf) - n:
+            n = self._put(n, msg)
+            msg = None
+        self._write(self.buf, n)
+        if msg:
+            self._write(msg)
+
+    def _send_ack(self, op, pid):
+        struct.pack_into("!BBH", self.buf, 0, op, 2, pid)
+        self._write(self.buf, 4)
+
+    def _retransmit(self, now=False):
+        t = utime.ticks_ms()
+        for pid in self.inflight:
+            p = self.inflight[pid]
+            if now or utime.ticks_diff(t, p[2]) >= self.retry_ms:
+                if p[1]:
+                    self._send_ack(0x62, pid)
+                else:
+                    n = self._put_publish(0, p[3], p[4], p[5], p[0], pid, True)
+                    self._send(n, p[4])
+                p[2] = t
+
+    def _wait_window(self, size):
+        # Processes incoming packets until at most size publishes are in
+        # flight, resending unacknowledged ones every retry_ms meanwhile
+        while len(self.inflight) > size:
+            if self.poller.poll(self.retry_ms):
+                self.wait_msg()
+            self._retransmit()
+
+    def wait_inflight(self):
+        self._wait_window(0)
+
+    def publish(self, topic, msg, retain=False, qos=0):
+        # Returns without waiting for acknowledgement; with QoS 1 or 2 the
+        # packet id is returned and stays in self.inflight until acknowledged.
+        assert 0 <= qos <= 2
+        self._keepalive(False)
+        pid = None
+        if qos:
+            self._wait_window(self.window - 1)
+            pid = self._next_pid()
+        n = self._put_publish(0, topic, msg, retain, qos, pid)
+        #print(hex(n), hexlify(self.buf[:n], ":"))
+        self._send(n, msg)
+        if qos:
+            self.inflight[pid] = [qos, 0, utime.ticks_ms(), topic, msg, retain]
+        return pid
+
+    # Sends several (topic, msg) pairs, packing as many PUBLISH packets
+    # into each socket write as the packet buffer holds.
+    def publish_many(self, msgs, retain=False, qos=0):
+        assert 0 <= qos <= 2
+        self._keepalive(False)
+        n = 0
+        for topic, msg in msgs:
+            if n and (n + 9 + len(topic) + len(msg) > len(self.buf)
+                      or qos and len(self.inflight) >= self.window):
+                self._write(self.buf, n)
+                n = 0
+            pid = None
+            if qos:
+                self._wait_window(self.window - 1)
+                pid = self._next_pid()
+                self.inflight[pid] = [qos, 0, utime.ticks_ms(), topic, msg, retain]
+            n = self._put_publish(n, topic, msg, retain, qos, pid)
+            if len(msg) <= len(self.buf) - n:
+                n = self._put(n, msg)
+            else:
+                self._send(n, msg)
+                n = 0
+        if n:
+            self._write(self.buf, n)
 
     def subscribe(self, topic, qos=0):
         assert self.cb is not None, "Subscribe callback is not set"
-        pkt = bytearray(b"\x82\0\0\0")
-        self.pid += 1
-        struct.pack_into("!BH", pkt, 1, 2 + 2 + len(topic) + 1, self.pid)
-        #print(hex(len(pkt)), hexlify(pkt, ":"))
-        self.sock.write(pkt)
-        self._send_str(topic)
-        self.sock.write(qos.to_bytes(1, "little"))
+        pid = self._next_pid()
+        n = self._put_header(0, 0x82, 2 + 2 + len(topic) + 1)
+        n = self._put_pid(n, pid)
+        n = self._put_str(n, topic)
+        self._reserve(n + 1)
+        self.buf[n] = qos
+        #print(hex(n + 1), hexlify(self.buf[:n + 1], ":"))
+        self._write(self.buf, n + 1)
         while 1:
             op = self.wait_msg()
             if op == 0x90:
                 resp = self.sock.read(4)
                 #print(resp)
-                assert resp[1] == pkt[2] and resp[2] == pkt[3]
+                assert resp[1] == pid >> 8 and resp[2] == pid & 0xff
                 if resp[3] == 0x80:
                     raise MQTTException(resp[3])
                 return
@@ -171,11 +341,22 @@ class MQTTClient:
             return None
         if res == b"":
             raise OSError(-1)
+        self.last_rx = utime.ticks_ms()
         if res == b"\xd0":  # PINGRESP
             sz = self.sock.read(1)[0]
             assert sz == 0
+            if self.ping_at is not None:
+                self.rtt = utime.ticks_diff(self.last_rx, self.ping_at)
+                self.ping_at = None
             return None
         op = res[0]
+        if op in (0x40, 0x50, 0x62, 0x70):
+            sz = self.sock.read(1)
+            assert sz == b"\x02"
+            pid = self.sock.read(2)
+            pid = pid[0] << 8 | pid[1]
+            self._handle_ack(op, pid)
+            return op
         if op & 0xf0 != 0x30:
             return op
         sz = self._recv_len()
@@ -188,17 +369,40 @@ class MQTTClient:
             pid = pid[0] << 8 | pid[1]
             sz -= 2
         msg = self.sock.read(sz)
+        if op & 6 == 4:
+            # QoS 2: deliver once, however often the broker resends it
+            if pid not in self.rcv_pids:
+                self.rcv_pids.add(pid)
+                self.cb(topic, msg)
+            self._send_ack(0x50, pid)
+            return
         self.cb(topic, msg)
         if op & 6 == 2:
-            pkt = bytearray(b"\x40\x02\0\0")
-            struct.pack_into("!H", pkt, 2, pid)
-            self.sock.write(pkt)
-        elif op & 6 == 4:
-            assert 0
+            self._send_ack(0x40, pid)
+
+    def _handle_ack(self, op, pid):
+        if op == 0x62:
+            # PUBREL for an incoming QoS 2 message
+            self.rcv_pids.discard(pid)
+            self._send_ack(0x70, pid)
+            return
+        p = self.inflight.get(pid)
+        if p is None:
+            return
+        if op == 0x50:
+            # PUBREC: the broker has the message, release it
+            p[1] = 1
+            p[2] = utime.ticks_ms()
+            self._send_ack(0x62, pid)
+        else:
+            del self.inflight[pid]
 
-    # Checks whether a pending message from server is available.
+    # Checks whether pending messages from server are available.
     # If not, returns immediately with None. Otherwise, does
-    # the same processing as wait_msg.
+    # the same processing as wait_msg for every one of them, before
+    # anything unacknowledged is sent again.
     def check_msg(self):
-        self.sock.setblocking(False)
-        return self.wait_msg()
+        self._keepalive()
+        op = self._read_pending()
+        self._retransmit()
+        return op
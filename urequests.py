@@ -1,4 +1,15 @@
 import usocket
+import dnscache
+
+# Bodies up to this size are read on close() so the connection can be reused
+DRAIN_LIMIT = 512
+# Default buffer size for iter_content() and save_to()
+CHUNK_SIZE = 256
+
+# Request heads are assembled here so that a request goes out in one or two
+# writes instead of one per header field
+_head = bytearray(256)
+
 
 class Response:
 
@@ -6,21 +17,111 @@ class Response:
         self.raw = f
         self.encoding = "utf-8"
         self._cached = None
+        # body bytes left to read (of the current chunk if chunked),
+        # None if the body runs until the server closes the connection
+        self._length = None
+        self._chunked = False
+        self._session = None
+        self._key = None
 
     def close(self):
         if self.raw:
+            if self._session is not None and not self._chunked and self._length is not None \
+                    and 0 < self._length <= DRAIN_LIMIT:
+                # a short unread body is cheaper to drain than a new connection
+                try:
+                    self._length -= len(self.raw.read(self._length))
+                except OSError:
+                    pass
+            self._finish()
+        self._cached = None
+
+    def _finish(self):
+        if self._session is not None and self._length == 0 and not self._chunked:
+            self._session._put(self._key, self.raw)
+        else:
+            self.raw.close()
+        self.raw = None
+
+    def _next_chunk(self):
+        l = self.raw.readline()
+        if not l:
+            raise OSError(-1)
+        self._length = int(l.split(b";", 1)[0], 16)
+        if self._length == 0:
+            # last chunk; skip any trailer headers
+            while True:
+                l = self.raw.readline()
+                if not l or l == b"\r\n":
+                    break
+            self._chunked = False
+
+    def readinto(self, buf, nbytes=None):
+        # Reads up to nbytes (default len(buf)) of the body into buf and
+        # returns how many were read, 0 once the body is exhausted.
+        if self.raw is None:
+            return 0
+        n = len(buf) if nbytes is None else nbytes
+        try:
+            if self._chunked and not self._length:
+                self._next_chunk()
+            if self._length is not None and self._length < n:
+                n = self._length
+            got = self.raw.readinto(buf, n) if n else 0
+            if self._length is not None:
+                if n and not got:
+                    # the server closed the connection mid-body
+                    raise OSError(-1)
+                self._length -= got
+                if self._chunked and self._length == 0:
+                    self.raw.readline()
+        except:
             self.raw.close()
             self.raw = None
-        self._cached = None
+            raise
+        if not got or (self._length == 0 and not self._chunked):
+            self._finish()
+        return got
+
+    def iter_content(self, chunk_size=CHUNK_SIZE):
+        # The chunks are views into one reused buffer, so copy any you keep
+        buf = bytearray(chunk_size)
+        mv = memoryview(buf)
+        while True:
+            n = self.readinto(buf)
+            if not n:
+                break
+            yield mv[:n]
+
+    def save_to(self, path, chunk_size=CHUNK_SIZE):
+        # Streams the body into a file and returns its size in bytes
+        size = 0
+        with open(path, "wb") as f:
+            for chunk in self.iter_content(chunk_size):
+                f.write(chunk)
+                size += len(chunk)
+        return size
 
     @property
     def content(self):
         if self._cached is None:
+            if self._chunked:
+                data = bytearray()
+                for chunk in self.iter_content():
+                    data.extend(chunk)
+                self._cached = bytes(data)
+                return self._cached
             try:
-                self._cached = self.raw.read()
-            finally:
+                if self._length is None:
+                    self._cached = self.raw.read()
+                else:
+                    self._cached = self.raw.read(self._length)
+                    self._length -= len(self._cached)
+            except:
                 self.raw.close()
                 self.raw = None
+                raise
+            self._finish()
         return self._cached
 
     @property
@@ -32,7 +133,7 @@ class Response:
         return ujson.loads(self.content)
 
 
-def request(method, url, data=None, json=None, headers={}, stream=None):
+def _parse_url(url):
     try:
         proto, dummy, host, path = url.split("/", 3)
     except ValueError:
@@ -41,7 +142,6 @@ def request(method, url, data=None, json=None, headers={}, stream=None):
     if proto == "http:":
         port = 80
     elif proto == "https:":
-        import ussl
         port = 443
     else:
         raise ValueError("Unsupported protocol: " + proto)
@@ -49,52 +149,128 @@ def request(method, url, data=None, json=None, headers={}, stream=None):
     if ":" in host:
         host, port = host.split(":", 1)
         port = int(port)
+    return proto, host, port, path
 
-    ai = usocket.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)
+
+def _connect(proto, host, port):
+    ai = dnscache.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)
     ai = ai[0]
 
-    s = usocket.socket(ai[0], ai[1], ai[2])
+    # the cached answer may come from a lookup for another port or type
+    s = usocket.socket(ai[0], usocket.SOCK_STREAM)
     try:
-        s.connect(ai[-1])
+        try:
+            s.connect((ai[-1][0], port))
+        except OSError:
+            # the host may have moved; look it up again next time
+            dnscache.forget(host)
+            raise
         if proto == "https:":
+            import ussl
             s = ussl.wrap_socket(s, server_hostname=host)
-        s.write(b"%s /%s HTTP/1.0\r\n" % (method, path))
-        if not "Host" in headers:
-            s.write(b"Host: %s\r\n" % host)
-        # Iterate over keys to avoid tuple alloc
-        for k in headers:
-            s.write(k)
-            s.write(b": ")
-            s.write(headers[k])
-            s.write(b"\r\n")
-        if json is not None:
-            assert data is None
-            import ujson
-            data = ujson.dumps(json)
-            s.write(b"Content-Type: application/json\r\n")
-        if data:
-            s.write(b"Content-Length: %d\r\n" % len(data))
-        s.write(b"\r\n")
-        if data:
-            s.write(data)
+    except OSError:
+        s.close()
+        raise
+    return s
+
+
+def _put(n, s):
+    # Copies s into the head buffer at offset n, growing the buffer if
+    # needed, and returns the offset just past it
+    global _head
+    if isinstance(s, str):
+        s = s.encode()
+    end = n + len(s)
+    if end > len(_head):
+        _head.extend(bytearray(end - len(_head) + 64))
+    _head[n:end] = s
+    return end
+
+
+def _build(method, host, path, headers, data, json, version):
+    # Serializes the request head into _head and returns its length and the
+    # body. Bodies that still fit in the buffer are appended to the head.
+    n = _put(0, method)
+    n = _put(n, " /")
+    n = _put(n, path)
+    n = _put(n, " ")
+    n = _put(n, version)
+    n = _put(n, "\r\n")
+    if not "Host" in headers:
+        n = _put(n, "Host: ")
+        n = _put(n, host)
+        n = _put(n, "\r\n")
+    # Iterate over keys to avoid tuple alloc
+    for k in headers:
+        n = _put(n, k)
+        n = _put(n, ": ")
+        n = _put(n, headers[k])
+        n = _put(n, "\r\n")
+    if json is not None:
+        assert data is None
+        import ujson
+        data = ujson.dumps(json)
+        n = _put(n, "Content-Type: application/json\r\n")
+    if data:
+        n = _put(n, "Content-Length: ")
+        n = _put(n, str(len(data)))
+        n = _put(n, "\r\n")
+    n = _put(n, "\r\n")
+    if data and n + len(data) <= len(_head):
+        n = _put(n, data)
+        data = None
+    return n, data
+
+
+def _send(s, method, host, path, headers, data, json, version):
+    n, data = _build(method, host, path, headers, data, json, version)
+    s.write(_head, n)
+    if data:
+        s.write(data)
 
+
+def _status(l):
+    # Parses the status line into [status, reason, Content-Length,
+    # keep-alive, chunked], the last three filled in by _header()
+    #print(l)
+    if not l:
+        raise OSError(-1)
+    l = l.split(None, 2)
+    reason = ""
+    if len(l) > 2:
+        reason = l[2].rstrip()
+    return [int(l[1]), reason, None, l[0] == b"HTTP/1.1", False]
+
+
+def _header(head, l):
+    #print(l)
+    h = l.lower()
+    if h.startswith(b"transfer-encoding:"):
+        head[4] = b"chunked" in h
+    elif h.startswith(b"content-length:"):
+        head[2] = int(l[15:])
+    elif h.startswith(b"connection:"):
+        head[3] = b"keep-alive" in h
+    elif h.startswith(b"location:") and not 200 <= head[0] <= 299:
+        raise NotImplementedError("Redirects not yet supported")
+
+
+def _read_head(s):
+    head = _status(s.readline())
+    while True:
         l = s.readline()
-        #print(l)
-        l = l.split(None, 2)
-        status = int(l[1])
-        reason = ""
-        if len(l) > 2:
-            reason = l[2].rstrip()
-        while True:
-            l = s.readline()
-            if not l or l == b"\r\n":
-                break
-            #print(l)
-            if l.startswith(b"Transfer-Encoding:"):
-                if b"chunked" in l:
-                    raise ValueError("Unsupported " + l)
-            elif l.startswith(b"Location:") and not 200 <= status <= 299:
-                raise NotImplementedError("Redirects not yet supported")
+        if not l or l == b"\r\n":
+            break
+        _header(head, l)
+    return head
+
+
+def request(method, url, data=None, json=None, headers={}, stream=None):
+    proto, host, port, path = _parse_url(url)
+    s = _connect(proto, host, port)
+    try:
+        _send(s, method, host, path, headers, data, json, "HTTP/1.0")
+        status, reason, length, keep_alive, chunked = _read_head(s)
     except OSError:
         s.close()
         raise
@@ -102,6 +278,135 @@ def request(method, url, data=None, json=None, headers={}, stream=None):
     resp = Response(s)
     resp.status_code = status
     resp.reason = reason
+    resp._length = length
+    resp._chunked = chunked
+    return resp
+
+
+class Session:
+    # Keeps HTTP/1.1 connections open between requests, one idle connection
+    # per (protocol, host, port), at most pool_size of them in total.
+    # A connection goes back to the pool once its response body has been
+    # read in full, as delimited by Content-Length or the last chunk.
+
+    def __init__(self, pool_size=2):
+        self.pool_size = pool_size
+        self.pool = []
+
+    def _take(self, key):
+        for i in range(len(self.pool)):
+            if self.pool[i][0] == key:
+                return self.pool.pop(i)[1]
+        return None
+
+    def _put(self, key, s):
+        old = self._take(key)
+        if old is not None:
+            old.close()
+        self.pool.append((key, s))
+        while len(self.pool) > self.pool_size:
+            self.pool.pop(0)[1].close()
+
+    def request(self, method, url, data=None, json=None, headers={}):
+        proto, host, port, path = _parse_url(url)
+        key = (proto, host, port)
+        s = self._take(key)
+        while True:
+            fresh = s is None
+            if fresh:
+                s = _connect(proto, host, port)
+            try:
+                _send(s, method, host, path, headers, data, json, "HTTP/1.1")
+                status, reason, length, keep_alive, chunked = _read_head(s)
+                break
+            except (OSError, IndexError):
+                s.close()
+                s = None
+                if fresh:
+                    raise
+                # the server closed the pooled connection; retry on a new one
+
+        if method == "HEAD" or status in (204, 304):
+            length = 0
+            chunked = False
+        resp = Response(s)
+        resp.status_code = status
+        resp.reason = reason
+        resp._length = length
+        resp._chunked = chunked
+        if keep_alive and (length is not None or chunked):
+            resp._session = self
+            resp._key = key
+        return resp
+
+    def head(self, url, **kw):
+        return self.request("HEAD", url, **kw)
+
+    def get(self, url, **kw):
+        return self.request("GET", url, **kw)
+
+    def post(self, url, **kw):
+        return self.request("POST", url, **kw)
+
+    def put(self, url, **kw):
+        return self.request("PUT", url, **kw)
+
+    def patch(self, url, **kw):
+        return self.request("PATCH", url, **kw)
+
+    def delete(self, url, **kw):
+        return self.request("DELETE", url, **kw)
+
+    def close(self):
+        while self.pool:
+            self.pool.pop()[1].close()
+
+
+# Same as request(), but yields to other uasyncio tasks while connecting
+# and waiting for the server. The body is read before returning.
+# Only http:// URLs are supported: ussl on the ESP8266 can only do the TLS
+# handshake on a blocking socket, so https raises ValueError; use request()
+# for those.
+async def request_async(method, url, data=None, json=None, headers={}):
+    import uasyncio
+    proto, host, port, path = _parse_url(url)
+    if proto == "https:":
+        raise ValueError("request_async supports http:// URLs only, use request() for https")
+
+    ai = dnscache.getaddrinfo(host, port, 0, usocket.SOCK_STREAM)
+    reader, writer = await uasyncio.open_connection(ai[0][-1][0], port)
+    try:
+        n, data = _build(method, host, path, headers, data, json, "HTTP/1.0")
+        writer.write(memoryview(_head)[:n])
+        if data:
+            writer.write(data)
+        await writer.drain()
+
+        head = _status(await reader.readline())
+        while True:
+            l = await reader.readline()
+            if not l or l == b"\r\n":
+                break
+            _header(head, l)
+        status, reason = head[0], head[1]
+        if head[4]:
+            content = bytearray()
+            while True:
+                n = int((await reader.readline()).split(b";", 1)[0], 16)
+                if n == 0:
+                    break
+                content.extend(await reader.readexactly(n))
+                await reader.readline()
+            content = bytes(content)
+        else:
+            content = await reader.read(-1)
+    finally:
+        writer.close()
+
+    resp = Response(None)
+    resp._cached = content
+    resp.status_code = status
+    resp.reason = reason
     return resp
 
 
@@ -122,3 +427,6 @@ def patch(url, **kw):
 
 def delete(url, **kw):
     return request("DELETE", url, **kw)
+
+async def post_async(url, **kw):
+    return await request_async("POST", url, **kw)
@@ -23,7 +23,181 @@ DEFAULT_PORTS = {
     "Buzzer": 2
 }
 
-i2c = machine.I2C(scl=machine.Pin(5), sda=machine.Pin(4))
+# The TSL2561 and the SSD1306/SSD1327 OLEDs all support 400 kHz fast mode
+I2C_FREQ = 400000
+
+
+class I2CBus:
+    # The shared I2C bus. It has the machine.I2C methods the drivers use and
+    # adds a cached scan, per-address [transactions, bytes, errors] counters
+    # and a uasyncio lock for sequences of transactions that other tasks must
+    # not interleave with.
+    #
+    # uasyncio only switches tasks at an await, so a synchronous call, be it
+    # one transaction or a driver's whole start()/write()/stop() run, always
+    # completes before another task touches the bus and needs no lock. The
+    # lock is for async code that awaits between transactions. A sequence
+    # that must not be split, like SSD1327.show_async (window, then rows),
+    # holds it from its first transaction to its last; steps that are
+    # independent, like starting and reading a TSL2561 conversion, take it
+    # each on their own so the bus stays free while they wait. Code of your
+    # own should do the same with "async with i2c.lock():".
+    #
+    # Callbacks run through micropython.schedule are the exception: they can
+    # run between any two statements, so also inside a raw transfer or while
+    # a task is suspended holding the lock. They should check busy() and try
+    # again later, as LightSensor.watch() does.
+
+    def __init__(self, scl, sda, freq=I2C_FREQ):
+        self.scl = machine.Pin(scl)
+        self.sda = machine.Pin(sda)
+        self._freq = freq
+        self.bus = machine.I2C(scl=self.scl, sda=self.sda, freq=freq)
+        # address -> present, from scan() or present()
+        self.seen = {}
+        self.scanned = False
+        self.counts = {}
+        self._lock = None
+        # a raw start()..stop() transfer is under way
+        self._open = False
+        self._raw = None
+        self._raw_bytes = 0
+        self._raw_error = False
+
+    def freq(self, value=None):
+        if value is None:
+            return self._freq
+        self._freq = value
+        self.bus.init(scl=self.scl, sda=self.sda, freq=value)
+
+    def _count(self, addr, nbytes, error=False):
+        c = self.counts.get(addr)
+        if c is None:
+            c = self.counts[addr] = [0, 0, 0]
+        c[0] += 1
+        c[1] += nbytes
+        if error:
+            c[2] += 1
+
+    def scan(self, refresh=False):
+        # Probes every address the first time only, unless refresh is set
+        if refresh or not self.scanned:
+            found = self.bus.scan()
+            self.seen = {}
+            for addr in found:
+                self.seen[addr] = True
+            self.scanned = True
+        return sorted(addr for addr in self.seen if self.seen[addr])
+
+    def present(self, addr, refresh=False):
+        # Whether a device answers at addr, probing just that address
+        # unless it is already known to be there
+        if not refresh and self.seen.get(addr):
+            return True
+        try:
+            self.bus.writeto(addr, b"")
+            found = True
+        except OSError:
+            found = False
+        self._count(addr, 0, not found)
+        self.seen[addr] = found
+        return found
+
+    def busy(self):
+        # Whether a raw transfer is open or a task holds the lock
+        return self._open or (self._lock is not None and self._lock.locked())
+
+    def lock(self):
+        # one lock for the whole bus, created on first use
+        import uasyncio
+        if self._lock is None:
+            self._lock = uasyncio.Lock()
+        return self._lock
+
+    def writeto(self, addr, buf, stop=True):
+        try:
+            n = self.bus.writeto(addr, buf, stop)
+        except OSError:
+            self._count(addr, len(buf), True)
+            raise
+        self._count(addr, len(buf))
+        return n
+
+    def readfrom(self, addr, nbytes, stop=True):
+        try:
+            data = self.bus.readfrom(addr, nbytes, stop)
+        except OSError:
+            self._count(addr, nbytes, True)
+            raise
+        self._count(addr, nbytes)
+        return data
+
+    def readfrom_into(self, addr, buf, stop=True):
+        try:
+            self.bus.readfrom_into(addr, buf, stop)
+        except OSError:
+            self._count(addr, len(buf), True)
+            raise
+        self._count(addr, len(buf))
+
+    def writeto_mem(self, addr, memaddr, buf, addrsize=8):
+        try:
+            self.bus.writeto_mem(addr, memaddr, buf, addrsize=addrsize)
+        except OSError:
+            self._count(addr, len(buf), True)
+            raise
+        self._count(addr, len(buf))
+
+    def readfrom_mem(self, addr, memaddr, nbytes, addrsize=8):
+        try:
+            data = self.bus.readfrom_mem(addr, memaddr, nbytes, addrsize=addrsize)
+        except OSError:
+            self._count(addr, nbytes, True)
+            raise
+        self._count(addr, nbytes)
+        return data
+
+    def readfrom_mem_into(self, addr, memaddr, buf, addrsize=8):
+        try:
+            self.bus.readfrom_mem_into(addr, memaddr, buf, addrsize=addrsize)
+        except OSError:
+            self._count(addr, len(buf), True)
+            raise
+        self._count(addr, len(buf))
+
+    # Raw transfers are counted as one transaction per start()/stop(), for
+    # the address in the first byte written
+
+    def start(self):
+        self._raw = None
+        self._raw_bytes = 0
+        self._raw_error = False
+        self._open = True
+        self.bus.start()
+
+    def write(self, buf):
+        n = self.bus.write(buf)
+        if self._raw is None and len(buf):
+            self._raw = buf[0] >> 1
+            self._raw_bytes = -1
+        self._raw_bytes += len(buf)
+        if n < len(buf):
+            self._raw_error = True
+        return n
+
+    def readinto(self, buf, nack=True):
+        self.bus.readinto(buf, nack)
+        self._raw_bytes += len(buf)
+
+    def stop(self):
+        self.bus.stop()
+        self._open = False
+        if self._raw is not None:
+            self._count(self._raw, self._raw_bytes, self._raw_error)
+            self._raw = None
+
+
+i2c = I2CBus(5, 4)
 
 class GroveDevice:
     